@@ -101,6 +101,13 @@ Let's put some data inside
 No error message? Good! You can see that your new document was indexed by
 going to this URL: http://localhost:9200/demo/_search
 
+To load many documents at once, put one JSON document per line in a file and
+send them with bulk requests:
+
+.. code-block:: console
+
+   $ flask index bulk demo-default-v1.0.0 example -b documents.ndjson
+
 Searching for data
 ~~~~~~~~~~~~~~~~~~
 
@@ -323,15 +330,20 @@ from the root level of the package directory. You can see a full example in the
 
 from __future__ import absolute_import, print_function
 
-from .api import RecordsSearch
+from .api import MultiRecordsSearch, RecordsSearch
+from .bulk import BulkIndexer
 from .ext import InvenioSearch
-from .proxies import current_search, current_search_client
+from .proxies import current_search, current_search_client, \
+    current_search_read_client
 from .version import __version__
 
 __all__ = (
     '__version__',
+    'BulkIndexer',
     'InvenioSearch',
+    'MultiRecordsSearch',
     'RecordsSearch',
     'current_search',
     'current_search_client',
+    'current_search_read_client',
 )
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Asynchronous search API.
+
+It requires Python 3.5 or later and ``elasticsearch-async``
+(``pip install invenio-search[async]``). The searches are sent through an
+asynchronous client, built once per event loop with its own connection pool
+(see ``SEARCH_ASYNC_CLIENT_CONFIG``):
+
+.. code-block:: python
+
+    from invenio_search.aio import AsyncRecordsSearch, execute_searches
+
+    async def stats(queries):
+        searches = [ExampleSearch(index='records').query(q)[:0]
+                    for q in queries]
+        return await execute_searches(searches, max_in_flight=200)
+
+Without Flask application context, pass the client with ``using``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+import inspect
+from collections import deque
+from functools import lru_cache
+
+from elasticsearch import VERSION as ES_VERSION
+from elasticsearch_dsl.connections import connections
+from werkzeug.local import LocalProxy
+
+from .api import MultiRecordsSearch, RecordsSearch, _route_search
+from .proxies import current_search
+
+
+def _get_async_search_client(index, cluster=None):
+    """Return the asynchronous client of a search.
+
+    :param index: The index or list of indices of the search.
+    :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``. If
+        ``None``, the cluster is routed by the indices.
+    """
+    cluster = _route_search(index, cluster)
+    if cluster is None:
+        return current_search.async_read_client
+    return current_search.get_async_client(cluster)
+
+
+@lru_cache(maxsize=None)
+def _connection_class():
+    """Return the connection class of the asynchronous clients.
+
+    It is an ``AIOHttpConnection`` whose pool of HTTP connections holds up to
+    ``maxsize`` connections (``AIOHttpConnection`` ignores it). The class is
+    built on first use, as ``elasticsearch-async`` is an optional dependency.
+    """
+    import aiohttp
+    from elasticsearch.connection import Connection
+    from elasticsearch_async.connection import AIOHttpConnection
+
+    class PooledAIOHttpConnection(AIOHttpConnection):
+        """Asynchronous connection with a bounded pool of HTTP connections."""
+
+        def __init__(self, host='localhost', port=9200, http_auth=None,
+                     use_ssl=False, verify_certs=False, ca_certs=None,
+                     client_cert=None, client_key=None, loop=None,
+                     use_dns_cache=True, maxsize=100, **kwargs):
+            """Initialize the connection like ``AIOHttpConnection``.
+
+            :param maxsize: Maximum number of concurrent HTTP connections.
+            """
+            Connection.__init__(self, host=host, port=port, **kwargs)
+
+            self.loop = asyncio.get_event_loop() if loop is None else loop
+
+            if http_auth is not None:
+                if isinstance(http_auth, str):
+                    http_auth = tuple(http_auth.split(':', 1))
+                if isinstance(http_auth, (tuple, list)):
+                    http_auth = aiohttp.BasicAuth(*http_auth)
+
+            self.session = aiohttp.ClientSession(
+                auth=http_auth,
+                conn_timeout=self.timeout,
+                connector=aiohttp.TCPConnector(
+                    loop=self.loop,
+                    verify_ssl=verify_certs,
+                    use_dns_cache=use_dns_cache,
+                    limit=maxsize,
+                )
+            )
+
+            self.base_url = 'http%s://%s:%d%s' % (
+                's' if use_ssl else '', host, port, self.url_prefix)
+
+    return PooledAIOHttpConnection
+
+
+def _not_supported(name):
+    """Return a method refusing to run a synchronous-only feature.
+
+    :param name: The name of the method.
+    """
+    def _method(*args, **kwargs):
+        raise NotImplementedError(
+            '{0}() is not supported by asynchronous searches.'.format(name))
+    _method.__name__ = name
+    _method.__doc__ = 'Not supported by asynchronous searches.'
+    return _method
+
+
+class AsyncRecordsSearch(RecordsSearch):
+    """Search records with an asynchronous client.
+
+    It is configured with the same ``Meta`` as :class:`RecordsSearch`, but
+    :meth:`execute` is a coroutine and :meth:`stream` an asynchronous
+    iterator. The other methods sending requests are not supported.
+    """
+
+    _route_client = staticmethod(_get_async_search_client)
+
+    count = _not_supported('count')
+    delete = _not_supported('delete')
+    scan = _not_supported('scan')
+    fetch_many = _not_supported('fetch_many')
+    sliced_stream = _not_supported('sliced_stream')
+    dump_slices = _not_supported('dump_slices')
+    faceted_search = _not_supported('faceted_search')
+    _scroll = _not_supported('_scroll')
+
+    async def execute(self, ignore_cache=False):
+        """Execute the search and return the response.
+
+        :param ignore_cache: Send the request even if it was already sent.
+        """
+        if ignore_cache or not hasattr(self, '_response'):
+            es = connections.get_connection(self._using)
+            raw = await es.search(
+                index=self._index,
+                doc_type=self._doc_type,
+                body=self._serialize_body(es.transport.serializer),
+                **self._request_params()
+            )
+            self._response = self._build_response(raw)
+        return self._response
+
+    def stream(self, batch_size=1000, sort=None, scroll=None):
+        """Iterate lazily over all hits of the search.
+
+        Like :meth:`RecordsSearch.stream`, with ``async for``:
+
+        .. code-block:: python
+
+            async for hit in AsyncRecordsSearch().stream():
+                ...
+
+        Call ``aclose()`` on the iterator to clear the scroll context when
+        leaving the loop early.
+
+        :param batch_size: Number of hits fetched per request.
+        :param sort: List of sort fields (see :meth:`Search.sort`).
+        :param scroll: How long the scroll context is kept alive between
+            two requests (e.g. ``'5m'``).
+        """
+        return _AsyncStream(self, batch_size=batch_size, sort=sort,
+                            scroll=scroll)
+
+
+class _AsyncStream(object):
+    """Asynchronous iterator over the hits of a search."""
+
+    def __init__(self, search, batch_size, sort=None, scroll=None):
+        """Initialize the iterator."""
+        search = search._batched(batch_size, sort=sort)
+        if not scroll and ES_VERSION[0] < 5:
+            scroll = '5m'
+        if scroll:
+            search = search._slice(0, 1)
+        else:
+            search = search.sort(*(list(search._sort) + [{'_uid': 'asc'}]))
+        self._search = search
+        self._batch_size = batch_size
+        self._scroll = scroll
+        self._scroll_id = None
+        self._hits = deque()
+        self._done = False
+
+    def __aiter__(self):
+        """Return the iterator."""
+        return self
+
+    async def __anext__(self):
+        """Return the next hit, fetching the next page if needed."""
+        while not self._hits:
+            if self._done:
+                await self.aclose()
+                raise StopAsyncIteration
+            await self._fetch()
+        return self._hits.popleft()
+
+    async def _fetch(self):
+        """Fetch the next page of hits."""
+        search = self._search
+        if not self._scroll:
+            hits = list((await search.execute()).hits)
+            if len(hits) < self._batch_size:
+                self._done = True
+            else:
+                self._search = search.extra(
+                    search_after=list(hits[-1].meta.sort))
+            self._hits.extend(hits)
+            return
+
+        es = connections.get_connection(search._using)
+        if self._scroll_id is None:
+            raw = await es.search(
+                index=search._index, doc_type=search._doc_type,
+                body=search.to_dict(), scroll=self._scroll,
+                **search._request_params())
+        else:
+            raw = await es.scroll(scroll_id=self._scroll_id,
+                                  scroll=self._scroll)
+        self._scroll_id = raw.get('_scroll_id', self._scroll_id)
+        hits = list(search._build_response(raw))
+        if not hits or not self._scroll_id:
+            self._done = True
+        self._hits.extend(hits)
+
+    async def aclose(self):
+        """Stop the iteration and clear the scroll context."""
+        self._done = True
+        self._hits.clear()
+        scroll_id, self._scroll_id = self._scroll_id, None
+        if scroll_id:
+            es = connections.get_connection(self._search._using)
+            await es.clear_scroll(body={'scroll_id': [scroll_id]},
+                                  ignore=(404, ))
+
+
+class AsyncMultiRecordsSearch(MultiRecordsSearch):
+    """Execute several searches with a single asynchronous ``_msearch``."""
+
+    def __init__(self, **kwargs):
+        """Use the asynchronous client for searches by default."""
+        routed = 'using' not in kwargs
+        if routed:
+            kwargs['using'] = LocalProxy(
+                lambda: current_search.async_read_client)
+        super(AsyncMultiRecordsSearch, self).__init__(**kwargs)
+        self._routed = routed
+
+    async def execute(self, ignore_cache=False, raise_on_error=True):
+        """Execute the searches and return the list of their responses.
+
+        :param ignore_cache: Send the request even if it was already sent.
+        :param raise_on_error: Raise an exception if any of the searches
+            failed, otherwise its response is ``None``.
+        """
+        if ignore_cache or not hasattr(self, '_response'):
+            body = self.to_dict()
+            groups = self._groups()
+            raws = await asyncio.gather(*[
+                es.msearch(
+                    index=self._index,
+                    doc_type=self._doc_type,
+                    body=self._group_body(body, positions),
+                    **self._group_params(positions)
+                ) for es, positions in groups])
+            responses = {}
+            for (_, positions), raw in zip(groups, raws):
+                responses.update(zip(positions, raw['responses']))
+            self._response = self._build_responses(responses,
+                                                   raise_on_error)
+
+        return self._response
+
+
+async def execute_searches(searches, max_in_flight=100):
+    """Execute searches concurrently and return their responses in order.
+
+    :param searches: Iterable of :class:`AsyncRecordsSearch`.
+    :param max_in_flight: Maximum number of requests sent at the same time.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def _execute(search):
+        async with semaphore:
+            return await search.execute()
+
+    return await asyncio.gather(*[_execute(search) for search in searches])
+
+
+async def close_clients():
+    """Close the asynchronous clients of the current event loop."""
+    clients = current_search._pop_async_clients(asyncio.get_event_loop())
+    for client in clients:
+        transport = client.transport
+        # ``transport.close()`` is synchronous and drops the coroutines
+        # closing the HTTP sessions, so do its work here and await them.
+        if getattr(transport, 'sniffing_task', None):
+            transport.sniffing_task.cancel()
+        pool = transport.connection_pool
+        for connection in getattr(pool, 'orig_connections',
+                                  pool.connections):
+            session = getattr(connection, 'session', None)
+            if session is not None and not session.closed:
+                result = session.close()
+                if inspect.isawaitable(result):
+                    await result
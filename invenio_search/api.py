@@ -20,24 +20,58 @@
 """Search engine API."""
 
 import hashlib
+import inspect
+import json
+import math
+import numbers
+import re
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
 from elasticsearch import VERSION as ES_VERSION
-from elasticsearch_dsl import FacetedSearch, Search
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, \
+    TransportError
+from elasticsearch_dsl import A, FacetedSearch, MultiSearch, Search
+from elasticsearch_dsl.connections import connections
 from elasticsearch_dsl.faceted_search import FacetedResponse
 from elasticsearch_dsl.query import Bool, Ids
-from flask import request
+from flask import current_app, g, has_app_context, request
+from werkzeug.local import LocalProxy
+from werkzeug.utils import import_string
 
-from .proxies import current_search_client
+from .proxies import current_search, current_search_read_client
+from .serializer import FastJSONSerializer
+
+try:
+    from queue import Empty, Full, Queue
+except ImportError:
+    from Queue import Empty, Full, Queue
 
 
 class DefaultFilter(object):
     """Shortcut for defining default filters with query parser."""
 
-    def __init__(self, query=None, query_parser=None):
-        """Build filter property with query parser."""
+    def __init__(self, query=None, query_parser=None, memoize=False,
+                 cache_key=None):
+        """Build filter property with query parser.
+
+        :param query: The query or a function returning it.
+        :param query_parser: Function building the filter from the query.
+        :param memoize: Build the filter only once per application context
+            (i.e. per request) and reuse it in all searches.
+        :param cache_key: Function returning a key which the memoized filter
+            depends on (e.g. the current user identifier). Setting it
+            enables memoization.
+        """
         self._query = query
         self.query_parser = query_parser or (lambda x: x)
+        self.memoize = memoize or cache_key is not None
+        self.cache_key = cache_key
 
     @property
     def query(self):
@@ -46,7 +80,350 @@ class DefaultFilter(object):
 
     def __get__(self, obj, objtype):
         """Return parsed query."""
-        return self.query_parser(self.query)
+        if not self.memoize or not has_app_context():
+            return self.query_parser(self.query)
+
+        filters = getattr(g, '_invenio_search_default_filters', None)
+        if filters is None:
+            filters = g._invenio_search_default_filters = {}
+        key = (id(self), self.cache_key() if self.cache_key else None)
+        if key not in filters:
+            filters[key] = self.query_parser(self.query)
+        return filters[key]
+
+
+class _SingleFlight(object):
+    """Share the result of a call among concurrent callers with same key."""
+
+    class _Call(object):
+        """A call in progress."""
+
+        def __init__(self):
+            """Initialize the call."""
+            self.event = threading.Event()
+            self.result = None
+            self.exception = None
+
+    def __init__(self):
+        """Initialize the calls in progress."""
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Call ``func`` unless a call with the same key is in progress.
+
+        Callers arriving while the call is in progress wait for it and get
+        the same result (or exception).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as exc:
+            call.exception = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+_single_flight = _SingleFlight()
+
+_cloning = threading.local()
+"""Set while a search is cloned, as its query and aggregations are copied."""
+
+_cache_serializer = FastJSONSerializer()
+"""Serializer of the cached responses."""
+
+
+class _LatencyTracker(object):
+    """Keep the latencies of the recent searches of each index."""
+
+    def __init__(self):
+        """Initialize the latencies."""
+        self._lock = threading.Lock()
+        self._latencies = {}
+
+    def record(self, key, latency, window):
+        """Record the latency of a search.
+
+        :param key: The searched indices.
+        :param latency: Duration of the search in seconds.
+        :param window: Number of latencies kept for the key.
+        """
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None or latencies.maxlen != window:
+                latencies = self._latencies[key] = deque(
+                    latencies or (), maxlen=window)
+            latencies.append(latency)
+
+    def percentile(self, key, percentile, min_samples=1):
+        """Return a percentile of the recent latencies.
+
+        :returns: The latency in seconds, or ``None`` if less than
+            ``min_samples`` latencies were recorded.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        index = int(math.ceil(percentile / 100.0 * len(latencies))) - 1
+        return latencies[max(0, index)]
+
+
+_latencies = _LatencyTracker()
+
+
+def _send_request(es, fallback, method, **kwargs):
+    """Send a request, to the fallback client if ``es`` is unavailable.
+
+    Requests which timed out are not sent again, so that a slow search does
+    not load the fallback cluster too.
+
+    :param es: The client.
+    :param fallback: The client used if ``es`` cannot be reached or its
+        circuit breaker is open, or ``None``.
+    :param method: The name of the client method, e.g. ``'search'``.
+    """
+    try:
+        return getattr(es, method)(**kwargs)
+    except ConnectionTimeout:
+        raise
+    except ConnectionError:
+        # The read client is unavailable, fall back to the default one.
+        if fallback is None:
+            raise
+        return getattr(fallback, method)(**kwargs)
+
+
+def _build_response(search, raw):
+    """Wrap a raw search response in the response class of a search."""
+    # Later versions of `elasticsearch-dsl` (>=5.1.0) changed the
+    # Response class constructor signature.
+    if ES_VERSION[0] > 2:
+        return search._response_class(search, raw)
+    return search._response_class(raw, callbacks=search._doc_type_map)
+
+
+_faceted_search_classes = {}
+
+
+def _freeze(value):
+    """Return a hashable version of a list of values."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _faceted_search_class(search_):
+    """Return the faceted search class for the configuration of a search.
+
+    The class is built once for each ``Meta`` and index, and reused.
+    """
+    meta = search_.Meta
+    index_name = search_._index[0]
+    meta_doc_types = getattr(meta, 'doc_types', ['_all'])
+    meta_fields = getattr(meta, 'fields', ('*', ))
+    meta_facets = getattr(meta, 'facets', {})
+    key = (meta, index_name, _freeze(meta_doc_types), _freeze(meta_fields),
+           id(meta_facets))
+
+    # The facets are kept with the class, so that their identifier is not
+    # reused by other facets while the class is registered.
+    facets, faceted_search_class = _faceted_search_classes.get(
+        key, (None, None))
+    if facets is meta_facets:
+        return faceted_search_class
+
+    class RecordsFacetedSearch(FacetedSearch):
+        """Pass defaults from ``cls.Meta`` object."""
+
+        index = index_name
+        doc_types = meta_doc_types
+        fields = meta_fields
+        facets = meta_facets
+
+        def __init__(self, search, **kwargs):
+            """Bind the search instance used by ``search()``."""
+            self._records_search = search
+            super(RecordsFacetedSearch, self).__init__(**kwargs)
+
+        def search(self):
+            """Use ``search`` or ``cls()`` instead of default Search."""
+            # Later versions of `elasticsearch-dsl` (>=5.1.0) changed the
+            # Elasticsearch FacetedResponse class constructor signature.
+            search = self._records_search
+            if ES_VERSION[0] > 2:
+                return search.response_class(FacetedResponse)
+            return search.response_class(partial(FacetedResponse, self))
+
+    _faceted_search_classes[key] = (meta_facets, RecordsFacetedSearch)
+    return RecordsFacetedSearch
+
+
+_static_aggs = {}
+_static_aggs_bodies = {}
+_STATIC_AGGS_PLACEHOLDER = 'invenio-search-static-agg-{0}-'.format(
+    uuid.uuid4().hex)
+_STATIC_AGGS_PLACEHOLDER_RE = re.compile(
+    '"{0}([0-9]+)"'.format(_STATIC_AGGS_PLACEHOLDER))
+
+
+def _has_default_filter(meta):
+    """Return if a ``Meta`` class has a default filter, without building it.
+
+    :param meta: The ``Meta`` class of a search class.
+    """
+    for class_ in inspect.getmro(meta):
+        if 'default_filter' in vars(class_):
+            return vars(class_)['default_filter'] is not None
+    return False
+
+
+def _get_static_aggs(meta):
+    """Return the static aggregations of a ``Meta`` as ``(name, agg)`` list.
+
+    The aggregation objects are built once and shared by all searches.
+    """
+    aggs = _static_aggs.get(meta)
+    if aggs is None:
+        aggs = _static_aggs[meta] = [
+            (name, A(agg)) for name, agg
+            in (getattr(meta, 'static_aggs', None) or {}).items()]
+    return aggs
+
+
+def _get_static_aggs_bodies(meta, serializer):
+    """Return the serialized static aggregations of a ``Meta``."""
+    key = (meta, type(serializer))
+    bodies = _static_aggs_bodies.get(key)
+    if bodies is None:
+        bodies = _static_aggs_bodies[key] = [
+            serializer.dumps(agg.to_dict())
+            for _, agg in _get_static_aggs(meta)]
+    return bodies
+
+
+def _preference_token(user_string):
+    """Return the preference of the user identified by a string.
+
+    See ``SEARCH_PREFERENCE_HASH`` and ``SEARCH_PREFERENCE_BUCKETS``.
+    """
+    hash_ = current_app.config.get('SEARCH_PREFERENCE_HASH')
+    data = user_string.encode('utf8')
+    if hash_ is None:
+        token = hashlib.md5(data).hexdigest()
+    else:
+        if isinstance(hash_, str):
+            hash_ = import_string(hash_)
+        token = hash_(data)
+
+    buckets = current_app.config.get('SEARCH_PREFERENCE_BUCKETS')
+    if buckets:
+        if not isinstance(token, numbers.Integral):
+            token = int(token, 16)
+        token = 'bucket-{0}'.format(token % buckets)
+    return str(token)
+
+
+def _route_search(index, cluster=None):
+    """Return the cluster of a search.
+
+    :param index: The index or list of indices of the search.
+    :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``. If
+        ``None``, the cluster is routed by the indices: it is the cluster of
+        the indices routed to another cluster than the default one, if any.
+    :raises ValueError: If the indices are routed to several clusters.
+    """
+    if cluster is not None or not index:
+        return cluster
+    if not isinstance(index, (list, tuple)):
+        index = [index]
+    clusters = set(current_search.cluster_for(name) for name in index)
+    clusters.discard(None)
+    if len(clusters) > 1:
+        raise ValueError('Indices {0} are in several clusters: {1}.'.format(
+            ', '.join(index), ', '.join(sorted(clusters))))
+    return clusters.pop() if clusters else None
+
+
+def _get_search_client(index, cluster=None):
+    """Return the client of a search.
+
+    :param index: The index or list of indices of the search.
+    :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``. If
+        ``None``, the cluster is routed by the indices.
+    :returns: The client of the cluster, or the read client for the default
+        cluster.
+    """
+    cluster = _route_search(index, cluster)
+    if cluster is None:
+        return current_search.read_client
+    return current_search.get_client(cluster)
+
+
+def _routed_client(search):
+    """Return a proxy to the client of the indices of a search.
+
+    The client is looked up when the proxy is used, with the indices the
+    search has at that time.
+    """
+    search_ref = weakref.ref(search)
+
+    def _get_client():
+        search = search_ref()
+        return search._route_client(search._index,
+                                    getattr(search.Meta, 'cluster', None))
+
+    return LocalProxy(_get_client)
+
+
+def _is_single_index(name):
+    """Return if an index name is known to point to a single index.
+
+    Only the indices registered from mapping files are known to be single
+    indices (or aliases of a single generation with
+    ``SEARCH_INDEX_GENERATIONS``). Any other name may be an alias of several
+    indices.
+    """
+    if not has_app_context():
+        return False
+    state = current_app.extensions.get('invenio-search')
+    return state is not None and name in state.mappings
+
+
+def _get_fallback_client(client):
+    """Return the default client if ``client`` is a distinct read client."""
+    if isinstance(client, LocalProxy):
+        client = client._get_current_object()
+    if not has_app_context():
+        return None
+    state = current_app.extensions.get('invenio-search')
+    if state is None:
+        return None
+    primary = state.client
+    if client is state.read_client and client is not primary:
+        return primary
+    return None
+
+
+class _SliceEnd(object):
+    """Marker put in the queue when a slice is exhausted or failed."""
+
+    def __init__(self, exception=None):
+        """Store the exception raised while scrolling the slice."""
+        self.exception = exception
 
 
 class RecordsSearch(Search):
@@ -66,20 +443,330 @@ class RecordsSearch(Search):
         Example: ``default_filter = DefaultFilter('_access.owner:"1"')``.
         """
 
+        cache_timeout = None
+        """Seconds the responses are cached (see ``SEARCH_RESULT_CACHE``).
+
+        If ``None``, ``SEARCH_RESULT_CACHE_TIMEOUT`` is used; ``0`` disables
+        the cache for this search class.
+        """
+
+        static_aggs = None
+        """Aggregations added to every search and serialized only once.
+
+        A dictionary (use an ``OrderedDict`` on Python 2) of aggregation
+        names to aggregations, e.g.
+        ``static_aggs = {'types': A('terms', field='type')}``. The
+        aggregations must not be modified once a search has been executed.
+        """
+
+        cluster = None
+        """Name of the cluster searched (see ``SEARCH_CLUSTERS``).
+
+        If ``None``, the cluster is given by ``SEARCH_CLUSTER_ROUTING`` for
+        the index.
+        """
+
+        hedge = None
+        """Send hedged requests (see ``SEARCH_HEDGING``).
+
+        If ``False``, the searches of this class are never hedged, e.g.
+        because they are expensive.
+        """
+
+        timeout = None
+        """Seconds a request of this search class may take.
+
+        It is sent as ``request_timeout`` and overrides the timeout of the
+        client, e.g. to give up early on autocompletion searches while
+        exports keep a larger budget. If ``None``, the timeout of the client
+        is used.
+        """
+
+    _route_client = staticmethod(_get_search_client)
+    """Function returning the client of a cluster (or of the indices)."""
+
     def __init__(self, **kwargs):
-        """Use Meta to set kwargs defaults."""
+        """Use Meta to set kwargs defaults.
+
+        Unless ``using`` is given, the client is looked up when the search is
+        executed, from ``Meta.cluster`` or the routing of its indices.
+        """
         kwargs.setdefault('index', getattr(self.Meta, 'index', None))
         kwargs.setdefault('doc_type', getattr(self.Meta, 'doc_types', None))
-        kwargs.setdefault('using', current_search_client)
+        routed = 'using' not in kwargs
 
         super(RecordsSearch, self).__init__(**kwargs)
 
+        self._routed = routed
+        if routed:
+            self._using = _routed_client(self)
+
+        if getattr(_cloning, 'active', False):
+            return
+
         default_filter = getattr(self.Meta, 'default_filter', None)
         if default_filter:
             # NOTE: https://github.com/elastic/elasticsearch/issues/21844
             self.query = Bool(minimum_should_match="0<1",
                               filter=default_filter)
 
+        for name, agg in _get_static_aggs(self.Meta):
+            self.aggs.bucket(name, agg)
+
+    def using(self, client):
+        """Return a search sent with the given client, without routing."""
+        search = super(RecordsSearch, self).using(client)
+        search._routed = False
+        return search
+
+    def _clone(self):
+        """Clone the search, routed with the indices of the clone.
+
+        The default filter is not built again for the clone, which gets a
+        copy of the query.
+        """
+        _cloning.active = True
+        try:
+            search = super(RecordsSearch, self)._clone()
+        finally:
+            _cloning.active = False
+        search._routed = self._routed
+        if self._routed:
+            search._using = _routed_client(search)
+        return search
+
+    def execute(self, ignore_cache=False):
+        """Execute the search and return the response.
+
+        If ``SEARCH_SINGLE_FLIGHT`` is enabled, identical searches executed
+        at the same time share a single request to Elasticsearch. If
+        ``SEARCH_HEDGING`` is set, a slow request is duplicated. If
+        ``SEARCH_RESULT_CACHE`` is set, responses are cached for
+        ``Meta.cache_timeout`` (or ``SEARCH_RESULT_CACHE_TIMEOUT``) seconds,
+        or until the next write done through this module.
+
+        :param ignore_cache: Send the request even if it was already sent or
+            its response is cached. The result cache is then updated with
+            the new response.
+        """
+        if not ignore_cache and hasattr(self, '_response'):
+            return self._response
+        if not has_app_context():
+            self._response = self._build_response(self._execute_raw())
+            return self._response
+
+        config = current_app.config
+        state = current_app.extensions.get('invenio-search')
+        cache = state.result_cache if state else None
+        timeout = getattr(self.Meta, 'cache_timeout', None)
+        if timeout is None:
+            timeout = config.get('SEARCH_RESULT_CACHE_TIMEOUT')
+        if timeout == 0:
+            cache = None
+
+        request_key = None
+        if config.get('SEARCH_SINGLE_FLIGHT'):
+            request_key = self._request_key()
+
+        def _fetch():
+            if config.get('SEARCH_SINGLE_FLIGHT'):
+                # The shared response is serialized and each caller gets its
+                # own copy, so that a caller modifying it does not change
+                # the responses of the others.
+                return _cache_serializer.loads(_single_flight.do(
+                    request_key,
+                    lambda: _cache_serializer.dumps(self._execute_raw())))
+            return self._execute_raw()
+
+        if cache is not None:
+            key = 'invenio-search:{0}:{1}'.format(
+                state.cache_generation, self._request_key(shared=True))
+            # Responses are cached serialized, so that a caller modifying
+            # its response does not change the responses of the others.
+            cached = None if ignore_cache else cache.get(key)
+            if cached is None:
+                raw = _fetch()
+                cache.set(key, _cache_serializer.dumps(raw), timeout=timeout)
+            else:
+                raw = _cache_serializer.loads(cached)
+        else:
+            raw = _fetch()
+
+        self._response = self._build_response(raw)
+        return self._response
+
+    def _execute_batch(self):
+        """Execute a search fetching a batch of an iteration.
+
+        Unlike :meth:`execute`, the response is neither cached nor shared
+        with identical searches and the request is not hedged, so that
+        iterating over many hits does not evict the cached responses.
+        """
+        self._response = self._build_response(self._execute_raw(hedge=False))
+        return self._response
+
+    def _execute_raw(self, hedge=True):
+        """Send the search request and return the raw response.
+
+        :param hedge: Hedge the request if ``SEARCH_HEDGING`` is set.
+        """
+        es = connections.get_connection(self._using)
+        if isinstance(es, LocalProxy):
+            es = es._get_current_object()
+        kwargs = self._request_params()
+        kwargs.update(
+            index=self._index,
+            doc_type=self._doc_type,
+            body=self._serialize_body(es.transport.serializer),
+        )
+        fallback = _get_fallback_client(es)
+
+        config = self._hedging_config() if hedge else None
+        if config is None:
+            return _send_request(es, fallback, 'search', **kwargs)
+        return self._execute_hedged(es, fallback, kwargs, config)
+
+    def _hedging_config(self):
+        """Return the hedging parameters, or ``None`` if it is disabled."""
+        if getattr(self.Meta, 'hedge', None) is False \
+                or not has_app_context() or 'scroll' in self._params:
+            return None
+        return current_app.config.get('SEARCH_HEDGING')
+
+    def _execute_hedged(self, es, fallback, kwargs, config):
+        """Send the search request, and a duplicate if it is too slow.
+
+        If no response arrived after the configured percentile of the
+        latencies of the recent searches of the same indices, the request is
+        sent again with another ``preference``, which usually selects other
+        shard copies. The first successful response is returned and the
+        other one is discarded.
+        """
+        key = tuple(self._index or ())
+        window = config.get('window', 1000)
+        delay = _latencies.percentile(
+            key, config.get('percentile', 95),
+            min_samples=config.get('min_samples', 100))
+        results = Queue()
+
+        def _send(params):
+            start = time.time()
+            try:
+                raw = _send_request(es, fallback, 'search', **params)
+            except Exception as exc:
+                results.put((False, exc))
+            else:
+                _latencies.record(key, time.time() - start, window)
+                results.put((True, raw))
+
+        if delay is None:
+            # Not enough latencies recorded yet to know what is slow.
+            _send(kwargs)
+            ok, result = results.get()
+            if not ok:
+                raise result
+            return result
+
+        def _start(params):
+            thread = threading.Thread(target=_send, args=(params, ))
+            thread.daemon = True
+            thread.start()
+
+        _start(kwargs)
+        pending = 1
+        try:
+            ok, result = results.get(
+                timeout=max(delay, config.get('min_delay', 0.01)))
+        except Empty:
+            # The duplicate keeps the replica stickiness of the preference,
+            # with a second choice of replicas.
+            preference = kwargs.get('preference') or uuid.uuid4().hex
+            _start(dict(kwargs, preference='{0}-hedge'.format(preference)))
+            pending += 1
+            ok, result = results.get()
+        pending -= 1
+
+        error = None
+        while not ok and pending:
+            error = error or result
+            ok, result = results.get()
+            pending -= 1
+        if not ok:
+            raise error or result
+        return result
+
+    def _serialize_body(self, serializer):
+        """Return the request body.
+
+        If the search has ``Meta.static_aggs``, the body is serialized with
+        ``serializer`` and the pre-serialized static aggregations are
+        spliced into it. The result is identical to
+        ``serializer.dumps(self.to_dict())``. Otherwise, the body is
+        returned as a dictionary.
+        """
+        static_aggs = _get_static_aggs(self.Meta)
+        aggs = self.aggs._params['aggs']
+        if not static_aggs or any(aggs.get(name) is not agg
+                                  for name, agg in static_aggs):
+            return self.to_dict()
+
+        static_indices = dict(
+            (name, i) for i, (name, _) in enumerate(static_aggs))
+        search = self._clone()
+        search.aggs._params['aggs'] = OrderedDict(
+            (name, agg) for name, agg in aggs.items()
+            if name not in static_indices)
+        body = search.to_dict()
+
+        # Keep the keys in the order used by ``Search.to_dict()``, with a
+        # placeholder string for each static aggregation.
+        dynamic_aggs = body.pop('aggs', {})
+        ordered = OrderedDict(
+            (key, body.pop(key)) for key in ('query', 'post_filter')
+            if key in body)
+        ordered['aggs'] = OrderedDict(
+            (name, dynamic_aggs[name] if name not in static_indices else
+             '{0}{1}'.format(_STATIC_AGGS_PLACEHOLDER, static_indices[name]))
+            for name in aggs)
+        ordered.update(body)
+
+        bodies = _get_static_aggs_bodies(self.Meta, serializer)
+        return _STATIC_AGGS_PLACEHOLDER_RE.sub(
+            lambda match: bodies[int(match.group(1))],
+            serializer.dumps(ordered))
+
+    def _request_params(self):
+        """Return the parameters of the search request.
+
+        They are the parameters of the search with ``Meta.timeout`` as
+        ``request_timeout``, which is kept out of ``_params`` as it is a
+        parameter of the client rather than of the search.
+        """
+        params = dict(self._params)
+        timeout = getattr(self.Meta, 'timeout', None)
+        if timeout is not None:
+            params.setdefault('request_timeout', timeout)
+        return params
+
+    def _request_key(self, shared=False):
+        """Return a digest identifying the search request.
+
+        :param shared: Identify the client by the hosts of its cluster
+            instead of the client object, so that the key is the same in all
+            processes and threads (e.g. for a shared result cache).
+        """
+        es = connections.get_connection(self._using)
+        if isinstance(es, LocalProxy):
+            es = es._get_current_object()
+        client_key = id(es)
+        if shared:
+            client_key = getattr(es.transport, 'hosts', None) or client_key
+        request_ = json.dumps(
+            [client_key, self._index, self._doc_type, self._params,
+             self.to_dict()],
+            sort_keys=True, default=str)
+        return hashlib.sha1(request_.encode('utf8')).hexdigest()
+
     def get_record(self, id_):
         """Return a record by its identifier.
 
@@ -96,6 +783,275 @@ class RecordsSearch(Search):
         """
         return self.query(Ids(values=[str(id_) for id_ in ids]))
 
+    def fetch_many(self, ids, batch_size=1000, source_includes=None,
+                   source_excludes=None):
+        """Fetch records by their identifiers, in the given order.
+
+        Documents are retrieved with realtime ``mget`` requests when the
+        search targets a single index registered from a mapping file and
+        has no default filter. Otherwise an ``ids`` query, sized to the
+        number of identifiers, is executed so that the default filter still
+        applies.
+
+        :param ids: A list of record identifiers.
+        :param batch_size: Maximum number of identifiers per request.
+        :param source_includes: List of source fields to return.
+        :param source_excludes: List of source fields to leave out.
+        :returns: A list with a hit for each identifier, or ``None`` if the
+            record was not found.
+        """
+        ids = [str(id_) for id_ in ids]
+        params = {}
+        if source_includes:
+            params['_source_include'] = source_includes
+        if source_excludes:
+            params['_source_exclude'] = source_excludes
+
+        found = {}
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            for hit in self._fetch_batch(batch, **params):
+                found[hit.meta.id] = hit
+        return [found.get(id_) for id_ in ids]
+
+    def _fetch_batch(self, ids, **params):
+        """Return the hits of the found records of one batch."""
+        index = self._index or []
+        if _has_default_filter(self.Meta) or len(index) != 1 \
+                or not _is_single_index(index[0]):
+            search = self._batched(len(ids)).query(Ids(values=ids))
+            return search.params(**params)._execute_batch()
+
+        doc_types = self._doc_type or []
+        es = connections.get_connection(self._using)
+        raw = _send_request(
+            es, _get_fallback_client(es), 'mget',
+            body={'ids': ids},
+            index=index[0],
+            doc_type=doc_types[0] if len(doc_types) == 1 else None,
+            **params
+        )
+        for doc in raw['docs']:
+            if doc.get('error'):
+                error = doc['error']
+                raise TransportError(
+                    'N/A', error.get('type', error)
+                    if isinstance(error, dict) else error, error)
+        docs = [doc for doc in raw['docs'] if doc.get('found')]
+        return self._build_response({'hits': {'hits': docs}})
+
+    def stream(self, batch_size=1000, sort=None, scroll=None):
+        """Iterate lazily over all hits of the search.
+
+        Pages are fetched with ``search_after``, sorting by ``sort`` (or the
+        sort of the search) with the document uid as tiebreaker. If
+        ``scroll`` is given, or ``search_after`` is not supported by the
+        Elasticsearch version, a scroll context is used instead and it is
+        cleared as soon as the generator is closed.
+
+        .. code-block:: python
+
+            for hit in RecordsSearch().stream(sort=['-_updated']):
+                ...
+
+        :param batch_size: Number of hits fetched per request.
+        :param sort: List of sort fields (see :meth:`Search.sort`).
+        :param scroll: How long the scroll context is kept alive between
+            two requests (e.g. ``'5m'``).
+        """
+        search = self._batched(batch_size, sort=sort)
+
+        if scroll or ES_VERSION[0] < 5:
+            hits = search._slice(0, 1)._scroll(scroll or '5m')
+            try:
+                for hit in hits:
+                    yield hit
+            finally:
+                hits.close()
+            return
+
+        search = search.sort(*(list(search._sort) + [{'_uid': 'asc'}]))
+        while True:
+            hits = search._execute_batch().hits
+            for hit in hits:
+                yield hit
+            if len(hits) < batch_size:
+                return
+            search = search.extra(search_after=list(hits[-1].meta.sort))
+
+    def sliced_stream(self, slices, batch_size=1000, scroll='5m',
+                      ordered=False, queue_size=1000):
+        """Iterate over all hits with a sliced scroll run in parallel.
+
+        Each slice is scrolled in its own thread. Hits are handed over
+        through bounded queues, so at most ``queue_size`` hits (per slice if
+        ``ordered``) are held in memory. Scroll contexts are cleared when the
+        generator is closed. Requires Elasticsearch 5 or later.
+
+        :param slices: Number of slices.
+        :param batch_size: Number of hits fetched per request and slice.
+        :param scroll: How long the scroll contexts are kept alive between
+            two requests.
+        :param ordered: If ``True``, all hits of a slice are yielded before
+            the hits of the next slice, otherwise hits are yielded as soon as
+            they arrive.
+        :param queue_size: Maximum number of hits waiting to be yielded.
+        """
+        # The slices are scrolled outside of the application context.
+        es = connections.get_connection(self._using)
+        if isinstance(es, LocalProxy):
+            es = es._get_current_object()
+        fallback = _get_fallback_client(es)
+        search = self._batched(batch_size).using(es)
+        queues = [Queue(maxsize=queue_size)
+                  for _ in range(slices if ordered else 1)]
+        stop = threading.Event()
+
+        def _put(queue, item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def _run(slice_id):
+            queue = queues[slice_id if ordered else 0]
+            hits = search._slice(slice_id, slices)._scroll(
+                scroll, fallback=fallback)
+            try:
+                for hit in hits:
+                    if not _put(queue, hit):
+                        return
+                _put(queue, _SliceEnd())
+            except Exception as exc:
+                _put(queue, _SliceEnd(exc))
+            finally:
+                hits.close()
+
+        def _drain(queue, remaining):
+            while remaining:
+                item = queue.get()
+                if isinstance(item, _SliceEnd):
+                    if item.exception is not None:
+                        raise item.exception
+                    remaining -= 1
+                else:
+                    yield item
+
+        pool = ThreadPool(processes=slices)
+        try:
+            pool.map_async(_run, range(slices))
+            if ordered:
+                for queue in queues:
+                    for hit in _drain(queue, 1):
+                        yield hit
+            else:
+                for hit in _drain(queues[0], slices):
+                    yield hit
+        finally:
+            stop.set()
+            pool.close()
+            pool.join()
+
+    def dump_slices(self, filename, slices, batch_size=1000, scroll='5m',
+                    serializer=None):
+        """Write the hits of each slice of a sliced scroll to its own file.
+
+        Requires Elasticsearch 5 or later.
+
+        :param filename: File name pattern formatted with the slice number
+            (e.g. ``'records-{0}.ndjson'``).
+        :param slices: Number of slices, scrolled in parallel.
+        :param batch_size: Number of hits fetched per request and slice.
+        :param scroll: How long the scroll contexts are kept alive between
+            two requests.
+        :param serializer: Function returning the line written for a hit
+            (default: the JSON of the document source).
+        :returns: A list with the file name and number of hits of each slice.
+        """
+        # The slices are scrolled outside of the application context.
+        es = connections.get_connection(self._using)
+        if isinstance(es, LocalProxy):
+            es = es._get_current_object()
+        fallback = _get_fallback_client(es)
+        search = self._batched(batch_size).using(es)
+        serializer = serializer or (lambda hit: json.dumps(hit.to_dict()))
+
+        def _dump(slice_id):
+            path = filename.format(slice_id)
+            count = 0
+            hits = search._slice(slice_id, slices)._scroll(
+                scroll, fallback=fallback)
+            try:
+                with open(path, 'w') as fp:
+                    for hit in hits:
+                        fp.write(serializer(hit) + '\n')
+                        count += 1
+            finally:
+                hits.close()
+            return path, count
+
+        pool = ThreadPool(processes=slices)
+        try:
+            return pool.map(_dump, range(slices))
+        finally:
+            pool.terminate()
+
+    def _batched(self, batch_size, sort=None):
+        """Return a copy fetching ``batch_size`` hits from the start."""
+        search = self.extra(size=batch_size)
+        search._extra.pop('from', None)
+        if sort:
+            search = search.sort(*sort)
+        return search
+
+    def _slice(self, slice_id, slices):
+        """Return a copy restricted to one slice of a sliced scroll."""
+        search = self
+        if not search._sort:
+            search = search.sort('_doc')
+        if slices > 1:
+            search = search.extra(slice={'id': slice_id, 'max': slices})
+        return search
+
+    def _scroll(self, scroll, fallback=None):
+        """Iterate over all hits with a scroll context.
+
+        :param scroll: How long the scroll context is kept alive.
+        :param fallback: The client used if the client of the search is
+            unavailable (default: the default client if the search uses a
+            distinct read client).
+        """
+        es = connections.get_connection(self._using)
+        if isinstance(es, LocalProxy):
+            es = es._get_current_object()
+        fallback = fallback or _get_fallback_client(es)
+        raw = _send_request(
+            es, fallback, 'search', index=self._index,
+            doc_type=self._doc_type, body=self.to_dict(), scroll=scroll,
+            **self._request_params())
+        scroll_id = raw.get('_scroll_id')
+        try:
+            while raw['hits']['hits']:
+                for hit in self._build_response(raw):
+                    yield hit
+                if not scroll_id:
+                    return
+                raw = _send_request(es, fallback, 'scroll',
+                                    scroll_id=scroll_id, scroll=scroll)
+                scroll_id = raw.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id:
+                _send_request(es, fallback, 'clear_scroll',
+                              body={'scroll_id': [scroll_id]},
+                              ignore=(404, ))
+
+    def _build_response(self, raw):
+        """Wrap a raw search response in the response class."""
+        return _build_response(self, raw)
+
     @classmethod
     def faceted_search(cls, query=None, filters=None, search=None):
         """Return faceted search instance with defaults set.
@@ -105,25 +1061,9 @@ class RecordsSearch(Search):
         :param search: An instance of ``Search`` class. (default: ``cls()``).
         """
         search_ = search or cls()
-
-        class RecordsFacetedSearch(FacetedSearch):
-            """Pass defaults from ``cls.Meta`` object."""
-
-            index = search_._index[0]
-            doc_types = getattr(search_.Meta, 'doc_types', ['_all'])
-            fields = getattr(search_.Meta, 'fields', ('*', ))
-            facets = getattr(search_.Meta, 'facets', {})
-
-            def search(self):
-                """Use ``search`` or ``cls()`` instead of default Search."""
-                # Later versions of `elasticsearch-dsl` (>=5.1.0) changed the
-                # Elasticsearch FacetedResponse class constructor signature.
-
-                if ES_VERSION[0] > 2:
-                    return search_.response_class(FacetedResponse)
-                return search_.response_class(partial(FacetedResponse, self))
-
-        return RecordsFacetedSearch(query=query, filters=filters or {})
+        faceted_search_class = _faceted_search_class(search_)
+        return faceted_search_class(
+            search_, query=query, filters=filters or {})
 
     def with_preference_param(self):
         """Add the preference param to the ES request and return a new Search.
@@ -149,11 +1089,141 @@ class RecordsSearch(Search):
         return user_agent or ''
 
     def _get_user_hash(self):
-        """Calculate a digest based on request's User-Agent and IP address."""
+        """Calculate a digest based on request's User-Agent and IP address.
+
+        It is computed once per request and stored on the request.
+        """
         if request:
-            user_hash = '{ip}-{ua}'.format(ip=request.remote_addr,
-                                           ua=self._get_user_agent())
-            alg = hashlib.md5()
-            alg.update(user_hash.encode('utf8'))
-            return alg.hexdigest()
+            user_hash = getattr(request, '_invenio_search_user_hash', None)
+            if user_hash is None:
+                user_hash = _preference_token('{ip}-{ua}'.format(
+                    ip=request.remote_addr, ua=self._get_user_agent()))
+                request._invenio_search_user_hash = user_hash
+            return user_hash
         return None
+
+
+class MultiRecordsSearch(MultiSearch):
+    """Execute several searches with a single ``_msearch`` request.
+
+    .. code-block:: python
+
+        latest = RecordsSearch().sort('-_created')[:5]
+        counts = RecordsSearch().with_preference_param()[:0]
+        MultiRecordsSearch().add(latest).add(counts).execute()
+        latest.execute()  # no additional request
+
+    The parameters of each search (e.g. ``preference``) are sent along with
+    it. Once executed, every added search holds its own response, so that
+    calling its ``execute()`` does not send another request.
+
+    Unless ``using`` is given, the searches are sent to the clusters of
+    their indices, with a ``_msearch`` request per cluster.
+    """
+
+    def __init__(self, **kwargs):
+        """Use the current search client by default."""
+        self._routed = 'using' not in kwargs
+        kwargs.setdefault('using', current_search_read_client)
+        super(MultiRecordsSearch, self).__init__(**kwargs)
+
+    def _clone(self):
+        """Clone the searches, keeping the routing."""
+        multi = super(MultiRecordsSearch, self)._clone()
+        multi._routed = self._routed
+        return multi
+
+    def _groups(self):
+        """Return the searches grouped by client.
+
+        :returns: A list of ``(client, positions)`` tuples, where
+            ``positions`` are the indices of the searches in the list of
+            added searches.
+        """
+        groups = OrderedDict()
+        for position, search in enumerate(self._searches):
+            using = self._using
+            if self._routed and getattr(search, '_routed', False):
+                using = search._using
+            es = connections.get_connection(using)
+            if isinstance(es, LocalProxy):
+                es = es._get_current_object()
+            groups.setdefault(id(es), (es, []))[1].append(position)
+        return list(groups.values())
+
+    def to_dict(self):
+        """Return the body of the ``_msearch`` request.
+
+        The ``request_timeout`` of the searches is a parameter of the client,
+        so it is left out of their headers.
+        """
+        out = super(MultiRecordsSearch, self).to_dict()
+        for header in out[::2]:
+            header.pop('request_timeout', None)
+        return out
+
+    def _group_params(self, positions):
+        """Return the parameters of the ``_msearch`` request of some searches.
+
+        The request gets the largest ``request_timeout`` of the searches if
+        they all have one, otherwise the timeout of the client.
+        """
+        params = dict(self._params)
+        timeouts = []
+        for position in positions:
+            search = self._searches[position]
+            if isinstance(search, RecordsSearch):
+                timeouts.append(
+                    search._request_params().get('request_timeout'))
+            else:
+                timeouts.append(search._params.get('request_timeout'))
+        if timeouts and None not in timeouts:
+            params.setdefault('request_timeout', max(timeouts))
+        return params
+
+    def _group_body(self, body, positions):
+        """Return the part of the ``_msearch`` body of some searches."""
+        return [line for position in positions
+                for line in body[2 * position:2 * position + 2]]
+
+    def _build_responses(self, responses, raise_on_error):
+        """Build the responses of the searches from the raw responses.
+
+        :param responses: Dictionary of raw responses by search position.
+        """
+        out = []
+        for position, search in enumerate(self._searches):
+            raw = responses[position]
+            if raw.get('error', False):
+                if raise_on_error:
+                    raise TransportError(
+                        'N/A', raw['error']['type'], raw['error'])
+                response = None
+            else:
+                response = search._response = _build_response(search, raw)
+            out.append(response)
+        return out
+
+    def execute(self, ignore_cache=False, raise_on_error=True):
+        """Execute the searches and return the list of their responses.
+
+        :param ignore_cache: Send the request even if it was already sent.
+        :param raise_on_error: Raise an exception if any of the searches
+            failed, otherwise its response is ``None``.
+        """
+        if ignore_cache or not hasattr(self, '_response'):
+            body = self.to_dict()
+            responses = {}
+            for es, positions in self._groups():
+                raw = _send_request(
+                    es, _get_fallback_client(es), 'msearch',
+                    index=self._index,
+                    doc_type=self._doc_type,
+                    body=self._group_body(body, positions),
+                    **self._group_params(positions)
+                )
+                responses.update(zip(positions, raw['responses']))
+            self._response = self._build_responses(responses,
+                                                   raise_on_error)
+
+        return self._response
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Circuit breakers for the Elasticsearch client.
+
+See ``SEARCH_CIRCUIT_BREAKER``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+from collections import deque
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+from elasticsearch.transport import Transport
+
+ENDPOINT_TYPES = ('search', 'get', 'bulk', 'admin')
+"""Types of endpoints with a circuit breaker each."""
+
+_SEARCH_ENDPOINTS = set(['_search', '_msearch', '_count', '_suggest',
+                         '_explain'])
+_GET_ENDPOINTS = set(['_mget', '_source'])
+_BULK_ENDPOINTS = set(['_bulk', '_update', '_create', '_delete_by_query',
+                       '_update_by_query'])
+
+
+def endpoint_type(method, url):
+    """Return the type of the endpoint of a request.
+
+    :param method: The HTTP method.
+    :param url: The URL path.
+    :returns: ``'search'``, ``'get'``, ``'bulk'`` (all writes) or
+        ``'admin'``.
+    """
+    parts = [part for part in url.split('?')[0].split('/') if part]
+    if _SEARCH_ENDPOINTS.intersection(parts):
+        return 'search'
+    if _GET_ENDPOINTS.intersection(parts):
+        return 'get'
+    if _BULK_ENDPOINTS.intersection(parts):
+        return 'bulk'
+    if any(part.startswith('_') for part in parts):
+        return 'admin'
+    if len(parts) == 3:
+        return 'get' if method in ('GET', 'HEAD') else 'bulk'
+    if len(parts) == 2 and method == 'POST':
+        return 'bulk'
+    return 'admin'
+
+
+def is_failure(exception):
+    """Return if an exception means that the cluster is unhealthy."""
+    if isinstance(exception, ConnectionError):
+        return True
+    status = getattr(exception, 'status_code', None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+class CircuitBreakerOpen(ConnectionError):
+    """Error raised when a request is refused by an open circuit breaker."""
+
+    def __str__(self):
+        """Return the error message."""
+        return 'CircuitBreakerOpen({0})'.format(self.error)
+
+
+class CircuitBreaker(object):
+    """Refuse requests for a while once too many of them failed.
+
+    The breaker is *closed* while less than ``failure_rate`` of the requests
+    of the last ``window`` seconds failed (or were slower than
+    ``slow_call_duration``). It is then *open* and refuses all requests
+    during ``reset_timeout`` seconds. It is then *half-open*: up to
+    ``half_open_calls`` requests are let through as probes, the breaker is
+    closed again if they succeed and opened again if one fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_rate=0.5, min_calls=20, window=30,
+                 reset_timeout=10, slow_call_duration=None,
+                 half_open_calls=1):
+        """Initialize the breaker.
+
+        :param name: The name of the breaker, used in error messages.
+        :param failure_rate: Ratio of failed requests opening the breaker.
+        :param min_calls: Minimum number of requests in the window before
+            the breaker can open.
+        :param window: Number of seconds of the rolling window.
+        :param reset_timeout: Number of seconds the breaker stays open.
+        :param slow_call_duration: Number of seconds after which a request
+            counts as failed, even if it succeeded.
+        :param half_open_calls: Number of concurrent probes when half-open.
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.slow_call_duration = slow_call_duration
+        self.half_open_calls = half_open_calls
+
+        self.rejected = 0
+        self.trips = 0
+        self._calls = deque()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Return the state of the breaker."""
+        with self._lock:
+            self._update_state(time.time())
+            return self._state
+
+    def _update_state(self, now):
+        """Switch from open to half-open once the reset timeout elapsed."""
+        if self._state == self.OPEN and \
+                now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+    def _open(self, now):
+        """Open the breaker."""
+        self._state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.trips += 1
+
+    def before_call(self):
+        """Check that a request can be sent.
+
+        :raises CircuitBreakerOpen: If the breaker is open, or half-open with
+            all the probes in progress.
+        """
+        with self._lock:
+            self._update_state(time.time())
+            if self._state == self.OPEN or (
+                    self._state == self.HALF_OPEN and
+                    self._probes >= self.half_open_calls):
+                self.rejected += 1
+                raise CircuitBreakerOpen(
+                    'N/A', 'Circuit breaker "{0}" is {1}.'.format(
+                        self.name, self._state), None)
+            if self._state == self.HALF_OPEN:
+                self._probes += 1
+
+    def record(self, latency, failed=False):
+        """Record the outcome of a request.
+
+        :param latency: Duration of the request in seconds.
+        :param failed: If the request failed.
+        """
+        now = time.time()
+        if self.slow_call_duration is not None and \
+                latency >= self.slow_call_duration:
+            failed = True
+
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open(now)
+                    return
+                self._state = self.CLOSED
+
+            self._calls.append((now, latency, failed))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+
+            if self._state == self.CLOSED and \
+                    len(self._calls) >= self.min_calls:
+                failures = sum(1 for call in self._calls if call[2])
+                if failures >= self.failure_rate * len(self._calls):
+                    self._open(now)
+
+    def stats(self):
+        """Return the state and statistics of the breaker for metrics."""
+        with self._lock:
+            now = time.time()
+            self._update_state(now)
+            calls = [call for call in self._calls
+                     if call[0] >= now - self.window]
+            latencies = [call[1] for call in calls]
+            failures = sum(1 for call in calls if call[2])
+            return {
+                'state': self._state,
+                'calls': len(calls),
+                'failures': failures,
+                'failure_rate': (float(failures) / len(calls)
+                                 if calls else 0.0),
+                'latency_avg': (sum(latencies) / len(latencies)
+                                if latencies else None),
+                'latency_max': max(latencies) if latencies else None,
+                'rejected': self.rejected,
+                'trips': self.trips,
+            }
+
+
+class CircuitBreakerTransport(Transport):
+    """Transport with a circuit breaker for each type of endpoint."""
+
+    def __init__(self, hosts, breakers=None, **kwargs):
+        """Initialize the transport.
+
+        :param breakers: Dictionary of :class:`CircuitBreaker` by endpoint
+            type (see :func:`endpoint_type`). Breakers are built with the
+            default settings for the missing types.
+        """
+        super(CircuitBreakerTransport, self).__init__(hosts, **kwargs)
+        self.breakers = dict(breakers or {})
+        for type_ in ENDPOINT_TYPES:
+            self.breakers.setdefault(type_, CircuitBreaker(type_))
+
+    def perform_request(self, method, url, params=None, body=None):
+        """Perform the request unless the circuit breaker is open."""
+        breaker = self.breakers[endpoint_type(method, url)]
+        breaker.before_call()
+        start = time.time()
+        try:
+            result = super(CircuitBreakerTransport, self).perform_request(
+                method, url, params=params, body=body)
+        except TransportError as exc:
+            breaker.record(time.time() - start, failed=is_failure(exc))
+            raise
+        except Exception:
+            breaker.record(time.time() - start)
+            raise
+        breaker.record(time.time() - start)
+        return result
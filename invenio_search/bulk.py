@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Bulk indexing API."""
+
+from __future__ import absolute_import, print_function
+
+import multiprocessing
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import BulkIndexError, expand_action
+from elasticsearch.serializer import JSONSerializer
+from flask import current_app, has_app_context
+
+from .proxies import current_search
+
+
+def _byte_size(line):
+    """Return the size in bytes of a serialized line once sent."""
+    if not isinstance(line, bytes):
+        line = line.encode('utf-8')
+    return len(line)
+
+
+def _prepare_lines(lines, id_field=None, serializer=None):
+    """Build the serialized bulk actions for lines of JSON documents.
+
+    This function runs in the worker processes of
+    :meth:`BulkIndexer.index_lines`.
+
+    :param lines: List of lines with one JSON document each.
+    :param id_field: Document field used as identifier.
+    :param serializer: The serializer of the client (default: the standard
+        ``JSONSerializer``).
+    :returns: A list with the action and document lines of each document.
+    """
+    serializer = serializer or JSONSerializer()
+    actions = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        document = serializer.loads(line)
+        meta = {}
+        if id_field and document.get(id_field) is not None:
+            meta['_id'] = document[id_field]
+        actions.append([serializer.dumps({'index': meta}),
+                        serializer.dumps(document)])
+    return actions
+
+
+def _search_state():
+    """Return the state of the extension of the current application."""
+    if has_app_context():
+        return current_app.extensions.get('invenio-search')
+
+
+def _batches(iterable, size):
+    """Split an iterable into lists of the given size."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkIndexer(object):
+    """Send documents to Elasticsearch with bulk requests.
+
+    Actions are buffered and sent once the buffer holds ``chunk_size``
+    actions or ``max_chunk_bytes`` bytes, or once ``flush_interval`` seconds
+    passed since the previous request. Up to ``max_in_flight`` requests are
+    sent at the same time; adding more actions blocks until one of them
+    finishes.
+
+    Actions rejected by the cluster (HTTP 429) are sent again up to
+    ``max_retries`` times, waiting ``initial_backoff`` seconds the first time
+    and twice as long every next time, up to ``max_backoff`` seconds.
+
+    The cached search results (see ``SEARCH_RESULT_CACHE``) are invalidated
+    once each request is done.
+
+    .. code-block:: python
+
+        with BulkIndexer(index='records', doc_type='record') as indexer:
+            for record in records:
+                indexer.index(record, id=record['control_number'])
+    """
+
+    def __init__(self, client=None, index=None, doc_type=None,
+                 chunk_size=500, max_chunk_bytes=100 * 1024 * 1024,
+                 flush_interval=None, max_in_flight=1, raise_on_error=True,
+                 max_retries=3, initial_backoff=2, max_backoff=600):
+        """Initialize the indexer.
+
+        :param client: The Elasticsearch client (default: the client of the
+            cluster of ``index``, see ``SEARCH_CLUSTER_ROUTING``).
+        :param index: Default index of the actions.
+        :param doc_type: Default document type of the actions.
+        :param chunk_size: Maximum number of actions per request.
+        :param max_chunk_bytes: Maximum size of a request body in bytes.
+        :param flush_interval: Maximum number of seconds between two
+            requests. It is checked when an action is added.
+        :param max_in_flight: Maximum number of concurrent requests.
+        :param raise_on_error: Raise :class:`BulkIndexError` if any action
+            fails, instead of only collecting the errors in ``errors``.
+        :param max_retries: Maximum number of times rejected actions are
+            sent again.
+        :param initial_backoff: Seconds to wait before the first retry.
+        :param max_backoff: Maximum number of seconds between retries.
+        """
+        if client is None:
+            client = current_search.client_for(index)
+        self.client = client
+        self._index = index
+        self._doc_type = doc_type
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.flush_interval = flush_interval
+        self.raise_on_error = raise_on_error
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self.success = 0
+        self.errors = []
+        self.rejected = 0
+        self.retries = 0
+        self.latencies = []
+
+        self._actions = []
+        self._size = 0
+        self._last_flush = time.time()
+        self._exception = None
+        self._lock = threading.Lock()
+        # The requests may be sent outside of the application context.
+        self._state = _search_state()
+        self._pool = None
+        if max_in_flight > 1:
+            self._pool = ThreadPool(processes=max_in_flight)
+            self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    @property
+    def stats(self):
+        """Return statistics about the requests sent so far."""
+        with self._lock:
+            latencies = list(self.latencies)
+        return {
+            'success': self.success,
+            'errors': len(self.errors),
+            'rejected': self.rejected,
+            'retries': self.retries,
+            'requests': len(latencies),
+            'latency_avg': (sum(latencies) / len(latencies)
+                            if latencies else None),
+            'latency_max': max(latencies) if latencies else None,
+        }
+
+    def add(self, action):
+        """Add an action in the format of :func:`elasticsearch.helpers.bulk`.
+
+        :param action: A dictionary with the document, optionally with
+            metadata keys (``_op_type``, ``_index``, ``_type``, ``_id``...).
+        """
+        serializer = self.client.transport.serializer
+        meta, data = expand_action(action)
+        lines = [serializer.dumps(meta)]
+        if data is not None:
+            lines.append(serializer.dumps(data))
+        self._append(lines)
+
+    def index(self, body, id=None, index=None, doc_type=None,
+              op_type='index'):
+        """Add a document to be indexed.
+
+        :param body: The document.
+        :param id: The document identifier.
+        :param index: The index (default: the indexer's ``index``).
+        :param doc_type: The document type (default: the indexer's
+            ``doc_type``).
+        :param op_type: ``'index'`` or ``'create'``.
+        """
+        action = {'_op_type': op_type, '_source': body}
+        if id is not None:
+            action['_id'] = id
+        if index is not None:
+            action['_index'] = index
+        if doc_type is not None:
+            action['_type'] = doc_type
+        self.add(action)
+
+    def index_lines(self, lines, id_field=None, processes=None,
+                    queue_size=None):
+        """Index documents from lines of JSON.
+
+        Lines are read lazily, so the whole input is never held in memory.
+
+        :param lines: Iterable of lines with one JSON document each.
+        :param id_field: Document field used as identifier.
+        :param processes: Number of processes decoding and serializing the
+            documents. If not set, it is done in the current process.
+        :param queue_size: Maximum number of chunks of ``chunk_size`` lines
+            waiting in the worker processes (default: ``2 * processes``).
+        """
+        batches = _batches(lines, self.chunk_size)
+        serializer = self.client.transport.serializer
+
+        if not processes or processes <= 1:
+            for batch in batches:
+                for action in _prepare_lines(batch, id_field=id_field,
+                                             serializer=serializer):
+                    self._append(action)
+            return
+
+        queue_size = queue_size or 2 * processes
+        pending = deque()
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            for batch in batches:
+                pending.append(
+                    pool.apply_async(_prepare_lines,
+                                     (batch, id_field, serializer)))
+                if len(pending) >= queue_size:
+                    for action in pending.popleft().get():
+                        self._append(action)
+            while pending:
+                for action in pending.popleft().get():
+                    self._append(action)
+        finally:
+            pool.terminate()
+
+    def _append(self, lines):
+        """Buffer the serialized lines of one action."""
+        size = sum(_byte_size(line) + 1 for line in lines)
+
+        if self._actions and self._size + size > self.max_chunk_bytes:
+            self.flush()
+
+        self._actions.append(lines)
+        self._size += size
+
+        if len(self._actions) >= self.chunk_size or (
+                self.flush_interval is not None and
+                time.time() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Send the buffered actions."""
+        self._raise_exception()
+        if not self._actions:
+            return
+
+        actions = self._actions
+        self._actions, self._size = [], 0
+        self._last_flush = time.time()
+
+        if self._pool is None:
+            self._send(actions)
+            self._raise_exception()
+        else:
+            self._in_flight.acquire()
+            self._pool.apply_async(self._send, (actions, ))
+
+    def close(self):
+        """Send the remaining actions and wait for all requests to finish.
+
+        :returns: A tuple with the number of successful actions and the list
+            of errors.
+        """
+        self.flush()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._raise_exception()
+        return self.success, self.errors
+
+    def _send(self, actions):
+        """Send one bulk request, retry rejected actions and collect errors."""
+        attempt = 0
+        try:
+            while actions:
+                body = ''.join(line + '\n'
+                               for lines in actions for line in lines)
+                start = time.time()
+                try:
+                    items = self.client.bulk(
+                        body=body, index=self._index,
+                        doc_type=self._doc_type)['items']
+                    statuses = [list(item.values())[0].get('status', 500)
+                                for item in items]
+                except TransportError as exc:
+                    if exc.status_code != 429 or \
+                            attempt >= self.max_retries:
+                        raise
+                    items, statuses = [], [429] * len(actions)
+                latency = time.time() - start
+
+                rejected = [action for action, status
+                            in zip(actions, statuses) if status == 429]
+                if attempt >= self.max_retries:
+                    rejected = []
+                errors = [item for item, status in zip(items, statuses)
+                          if not 200 <= status < 300 and
+                          not (status == 429 and rejected)]
+
+                with self._lock:
+                    self.latencies.append(latency)
+                    self.rejected += statuses.count(429)
+                    self.success += len([
+                        status for status in statuses
+                        if 200 <= status < 300])
+                    self.errors.extend(errors)
+                    if rejected:
+                        self.retries += 1
+                    if errors and self.raise_on_error and \
+                            not self._exception:
+                        self._exception = BulkIndexError(
+                            '{0} document(s) failed to index.'.format(
+                                len(errors)), errors)
+
+                if rejected:
+                    time.sleep(min(self.max_backoff,
+                                   self.initial_backoff * 2 ** attempt))
+                attempt += 1
+                actions = rejected
+        except Exception as exc:
+            with self._lock:
+                self._exception = self._exception or exc
+        finally:
+            # Searches cached while the request was sent may be stale.
+            if self._state is not None:
+                self._state.invalidate_cache()
+            if self._pool is not None:
+                self._in_flight.release()
+
+    def _raise_exception(self):
+        """Raise the first error of a previous request."""
+        with self._lock:
+            exception, self._exception = self._exception, None
+        if exception is not None:
+            raise exception
+
+    def __enter__(self):
+        """Return the indexer."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send the remaining actions, unless an exception occurred."""
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Search result cache backends.
+
+Any object providing ``get(key)`` and ``set(key, value, timeout=None)``
+methods can be used as cache (e.g. a ``werkzeug`` or ``Flask-Caching``
+cache shared between processes), see ``SEARCH_RESULT_CACHE``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache(object):
+    """Interface of search result cache backends."""
+
+    def get(self, key):
+        """Return the cached value or ``None`` if missing or expired."""
+        raise NotImplementedError()
+
+    def set(self, key, value, timeout=None):
+        """Store a value.
+
+        :param key: The cache key.
+        :param value: The value.
+        :param timeout: Number of seconds before the value expires. If
+            ``None``, it never expires.
+        """
+        raise NotImplementedError()
+
+
+class DictSearchCache(SearchCache):
+    """Cache storing values in a dictionary, without size limit."""
+
+    def __init__(self):
+        """Initialize the cache."""
+        self._data = {}
+
+    def get(self, key):
+        """Return the cached value or ``None`` if missing or expired."""
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        """Store a value."""
+        expires = time.time() + timeout if timeout else None
+        self._data[key] = (value, expires)
+
+
+class LRUSearchCache(SearchCache):
+    """In-process cache evicting the least recently used values."""
+
+    def __init__(self, maxsize=1000):
+        """Initialize the cache.
+
+        :param maxsize: Maximum number of cached values.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or ``None`` if missing or expired."""
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return None
+            if expires is not None and expires <= time.time():
+                return None
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store a value."""
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
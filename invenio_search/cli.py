@@ -29,11 +29,15 @@ from __future__ import absolute_import, print_function
 import json
 import pprint
 import sys
+import time
+from contextlib import contextmanager
 
 import click
+from elasticsearch import VERSION as ES_VERSION
 from flask.cli import with_appcontext
 
-from .proxies import current_search, current_search_client
+from .bulk import BulkIndexer
+from .proxies import current_search
 
 
 def abort_if_false(ctx, param, value):
@@ -42,6 +46,19 @@ def abort_if_false(ctx, param, value):
         ctx.abort()
 
 
+@contextmanager
+def report_retries():
+    """Print the number of requests retried in the block."""
+    policy = current_search.retry_policy
+    retries = policy.retries
+    try:
+        yield
+    finally:
+        if policy.retries > retries:
+            click.secho('Retried {0} request(s).'.format(
+                policy.retries - retries), fg='yellow', file=sys.stderr)
+
+
 #
 # Index management commands
 #
@@ -52,21 +69,27 @@ def index():
 
 @index.command()
 @click.option('--force', is_flag=True, default=False)
+@click.option('-c', '--concurrency', type=int, default=None,
+              help='Number of indices to create in parallel.')
 @with_appcontext
-def init(force):
+def init(force, concurrency):
     """Initialize registered aliases and mappings."""
-    click.secho('Creating indexes...', fg='green', bold=True, file=sys.stderr)
-    with click.progressbar(
-            current_search.create(ignore=[400] if force else None),
-            length=current_search.number_of_indexes) as bar:
-        for name, response in bar:
-            bar.label = name
-    click.secho('Putting templates...', fg='green', bold=True, file=sys.stderr)
-    with click.progressbar(
-            current_search.put_templates(ignore=[400] if force else None),
-            length=len(current_search.templates.keys())) as bar:
-        for response in bar:
-            bar.label = response
+    with report_retries():
+        click.secho('Creating indexes...', fg='green', bold=True,
+                    file=sys.stderr)
+        with click.progressbar(
+                current_search.create(ignore=[400] if force else None,
+                                      concurrency=concurrency),
+                length=current_search.number_of_indexes) as bar:
+            for name, response in bar:
+                bar.label = name
+        click.secho('Putting templates...', fg='green', bold=True,
+                    file=sys.stderr)
+        with click.progressbar(
+                current_search.put_templates(ignore=[400] if force else None),
+                length=len(current_search.templates.keys())) as bar:
+            for response in bar:
+                bar.label = response
 
 
 @index.command()
@@ -78,13 +101,36 @@ def init(force):
 def destroy(force):
     """Destroy all indexes."""
     click.secho('Destroying indexes...', fg='red', bold=True, file=sys.stderr)
-    with click.progressbar(
+    with report_retries(), click.progressbar(
             current_search.delete(ignore=[400, 404] if force else None),
             length=current_search.number_of_indexes) as bar:
         for name, response in bar:
             bar.label = name
 
 
+@index.command()
+@click.option('--yes-i-know', is_flag=True, callback=abort_if_false,
+              expose_value=False,
+              prompt='Do you know that you are going to reindex all indexes?')
+@click.option('--client-side', is_flag=True, default=False,
+              help='Copy documents with scan and bulk requests instead of '
+                   'the server-side reindex API.')
+@click.option('-s', '--slices', type=int, default=1,
+              help='Number of slices to copy in parallel.')
+@click.option('--chunk-size', type=int, default=500,
+              help='Number of documents per scroll and bulk request.')
+@with_appcontext
+def reindex(client_side, slices, chunk_size):
+    """Rebuild all indexes in a new generation and switch the aliases."""
+    click.secho('Reindexing...', fg='green', bold=True, file=sys.stderr)
+    with report_retries(), click.progressbar(
+            current_search.reindex(server_side=not client_side,
+                                   slices=slices, chunk_size=chunk_size),
+            length=current_search.number_of_indexes) as bar:
+        for name, response in bar:
+            bar.label = name
+
+
 @index.command()
 @click.argument('index_name')
 @click.option('-b', '--body', type=click.File('r'), default=sys.stdin)
@@ -93,11 +139,13 @@ def destroy(force):
 @with_appcontext
 def create(index_name, body, force, verbose):
     """Create a new index."""
-    result = current_search_client.indices.create(
-        index=index_name,
-        body=json.load(body),
-        ignore=[400] if force else None,
-    )
+    with report_retries():
+        result = current_search.retry_create(
+            current_search.client_for(index_name).indices.create,
+            index=index_name,
+            body=json.load(body),
+            ignore=[400] if force else None,
+        )
     if verbose:
         click.echo(json.dumps(result))
 
@@ -148,10 +196,12 @@ def list_cmd(only_active, only_aliases, verbose):
 @with_appcontext
 def delete(index_name, force, verbose):
     """Delete index by its name."""
-    result = current_search_client.indices.delete(
-        index=index_name,
-        ignore=[400, 404] if force else None,
-    )
+    with report_retries():
+        result = current_search.retry(
+            current_search.client_for(index_name).indices.delete,
+            index=index_name,
+            ignore=[400, 404] if force else None,
+        )
     if verbose:
         click.echo(json.dumps(result))
 
@@ -166,12 +216,82 @@ def delete(index_name, force, verbose):
 @with_appcontext
 def put(index_name, doc_type, identifier, body, force, verbose):
     """Index input data."""
-    result = current_search_client.index(
+    client = current_search.client_for(index_name)
+    kwargs = dict(
         index=index_name,
         doc_type=doc_type or index_name,
         id=identifier,
         body=json.load(body),
-        op_type='index' if force or identifier is None else 'create',
+        # Cached searches are invalidated once the document is visible.
+        refresh='wait_for' if ES_VERSION[0] >= 5 else True,
     )
+    with report_retries():
+        if identifier is None:
+            # A retry could index the document twice.
+            result = current_search.retry(
+                client.index, op_type='index', idempotent=False, **kwargs)
+        elif force:
+            result = current_search.retry(
+                client.index, op_type='index', **kwargs)
+        else:
+            # A conflict after a retry means the lost attempt created it.
+            result = current_search.retry_create(
+                client.index, op_type='create', **kwargs)
+    current_search.invalidate_cache()
     if verbose:
         click.echo(json.dumps(result))
+
+
+@index.command()
+@click.argument('index_name')
+@click.argument('doc_type')
+@click.option('-b', '--body', type=click.File('r'), default='-',
+              help='File with one JSON document per line.')
+@click.option('--id-field', default=None,
+              help='Document field used as identifier.')
+@click.option('--chunk-size', type=int, default=500,
+              help='Maximum number of documents per request.')
+@click.option('--max-chunk-bytes', type=int, default=100 * 1024 * 1024,
+              help='Maximum size of a request in bytes.')
+@click.option('--max-in-flight', type=int, default=1,
+              help='Maximum number of concurrent requests.')
+@click.option('-p', '--processes', type=int, default=None,
+              help='Number of processes decoding the documents.')
+@click.option('--max-retries', type=int, default=3,
+              help='Maximum number of retries of rejected documents.')
+@click.option('--bulk-load-mode', is_flag=True, default=False,
+              help='Disable refreshes and replicas while loading.')
+@click.option('--verbose', is_flag=True, default=False)
+@with_appcontext
+def bulk(index_name, doc_type, body, id_field, chunk_size, max_chunk_bytes,
+         max_in_flight, processes, max_retries, bulk_load_mode, verbose):
+    """Index newline-delimited JSON documents."""
+    indexer = BulkIndexer(
+        index=index_name,
+        doc_type=doc_type,
+        chunk_size=chunk_size,
+        max_chunk_bytes=max_chunk_bytes,
+        max_in_flight=max_in_flight,
+        max_retries=max_retries,
+        raise_on_error=False,
+    )
+    start = time.time()
+
+    def _load():
+        with indexer:
+            indexer.index_lines(body, id_field=id_field, processes=processes)
+
+    if bulk_load_mode:
+        with current_search.bulk_load_mode(index_name):
+            _load()
+    else:
+        _load()
+    if verbose:
+        stats = indexer.stats
+        elapsed = time.time() - start
+        stats['docs_per_second'] = stats['success'] / elapsed \
+            if elapsed else None
+        click.echo(json.dumps(stats, sort_keys=True))
+    if indexer.errors:
+        raise click.ClickException(
+            '{0} document(s) failed to index.'.format(len(indexer.errors)))
@@ -36,6 +36,154 @@ Elasticsearch
     <https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch>
 """
 
+SEARCH_CLIENT_CONFIG = None
+"""Keyword arguments of the Elasticsearch client.
+
+They are passed to the transport and to each connection, e.g.:
+
+.. code-block:: python
+
+    SEARCH_CLIENT_CONFIG = {
+        'timeout': 30,
+        'retry_on_timeout': True,
+        'maxsize': 25,
+        'connection_class':
+            'elasticsearch.connection:Urllib3HttpConnection',
+    }
+
+Defaults:
+
+* ``hosts``: ``SEARCH_ELASTIC_HOSTS``.
+* ``connection_class``: ``invenio_search.connection:RequestsHttpConnection``
+  (an import path or the class).
+* ``maxsize``: number of connections kept open per host, the number of
+  threads of the uWSGI worker or 10. Set it to the number of threads of the
+  worker with other servers.
+* ``http_compress``: ``True`` to ask for gzip-compressed responses. Responses
+  are compressed if ``http.compression`` is enabled in Elasticsearch.
+
+See `Elasticsearch
+<https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch>`_
+for the other arguments.
+"""
+
+SEARCH_CLUSTERS = {}
+"""Named Elasticsearch clusters besides the default one.
+
+Each cluster has its own client, built with the keyword arguments given
+here on top of ``SEARCH_CLIENT_CONFIG``, e.g.:
+
+.. code-block:: python
+
+    SEARCH_CLUSTERS = {
+        'archive': {'hosts': ['archive-es:9200']},
+    }
+"""
+
+SEARCH_CLUSTER_ROUTING = {}
+"""Cluster of aliases, indices and templates.
+
+A dictionary of alias, index or template names to names of clusters in
+``SEARCH_CLUSTERS``. Registered indices and aliases without entry are in the
+cluster of the closest alias above them, others are in the default cluster,
+e.g.:
+
+.. code-block:: python
+
+    SEARCH_CLUSTER_ROUTING = {
+        'records-archive': 'archive',
+    }
+
+Index management (``flask index init``, ``destroy``...), ``RecordsSearch``
+(unless ``Meta.cluster`` is set) and ``BulkIndexer`` use the client of the
+cluster of their index.
+"""
+
+SEARCH_ASYNC_CLIENT_CONFIG = None
+"""Keyword arguments of the asynchronous Elasticsearch clients.
+
+They are applied on top of ``SEARCH_CLIENT_CONFIG`` (without its
+``connection_class``) for the clients of ``invenio_search.aio``. Each client
+keeps up to ``maxsize`` HTTP connections per host (``100`` by default):
+
+.. code-block:: python
+
+    SEARCH_ASYNC_CLIENT_CONFIG = dict(maxsize=500)
+"""
+
+SEARCH_CLIENT_PER_THREAD = False
+"""Build one client per thread instead of one per process.
+
+Each client has its own connection pool (see ``maxsize`` in
+``SEARCH_CLIENT_CONFIG``).
+"""
+
+SEARCH_CLIENT_SERIALIZER = None
+"""Serializer of the request and response bodies of the Elasticsearch client.
+
+It can be a serializer instance, its class or its import path, e.g.
+``'invenio_search.serializer:FastJSONSerializer'``, which uses ``orjson``
+when it is installed. If `None`, the default serializer of
+``elasticsearch-py`` is used.
+"""
+
+SEARCH_CIRCUIT_BREAKER = None
+"""Circuit breakers of the Elasticsearch clients.
+
+If set, requests fail fast with
+:class:`~invenio_search.breaker.CircuitBreakerOpen` instead of waiting for
+the timeout of the client while a cluster is unhealthy. Each cluster has a
+breaker per type of endpoint (``search``, ``get``, ``bulk`` and ``admin``)
+which opens when too many requests failed (connection errors, timeouts,
+status 429 and 5xx) in a rolling window, and lets a probe through after a
+while to close again. It is a dictionary of the parameters of
+:class:`~invenio_search.breaker.CircuitBreaker`, which can be overridden per
+endpoint type, e.g.:
+
+.. code-block:: python
+
+    SEARCH_CIRCUIT_BREAKER = {
+        'failure_rate': 0.5,
+        'min_calls': 20,
+        'window': 30,
+        'reset_timeout': 10,
+        'search': {'slow_call_duration': 5},
+    }
+
+Use ``{}`` for the default parameters. The state of the breakers is returned
+by ``current_search.breaker_stats()``. If `None`, there is no circuit
+breaker.
+"""
+
+SEARCH_RETRY = {
+    'attempts': 5,
+    'backoff_base': 0.5,
+    'backoff_cap': 30,
+    'jitter': True,
+    'statuses': [429, 503],
+}
+"""Retry policy of the index management requests.
+
+The requests sent by ``current_search`` to create, delete and alias indices,
+put templates and the ``index create``, ``index delete`` and ``index put``
+commands are retried on connection errors and on the given status codes
+(e.g. ``429 es_rejected_execution_exception`` or ``503`` during a rolling
+restart), with an exponential backoff between ``backoff_base`` and
+``backoff_cap`` seconds. See :class:`~invenio_search.retry.RetryPolicy`. If
+`None`, the requests are not retried.
+"""
+
+SEARCH_READ_HOSTS = None
+"""List of hosts of the client used for searches.
+
+``RecordsSearch`` and ``MultiRecordsSearch`` searches in the default cluster
+are sent to these hosts (e.g. coordinating only nodes), with their own
+connection pool, while index management and writes use
+``SEARCH_ELASTIC_HOSTS``. Searches fall back to ``SEARCH_ELASTIC_HOSTS`` if
+the read hosts cannot be reached. If `None`, the default client is used for
+searches too.
+"""
+
 SEARCH_MAPPINGS = None  # loads all mappings and creates aliases for them
 """List of aliases for which, their search mappings should be created.
 
@@ -65,3 +213,100 @@ and their mappings for `authors`:
     SEARCH_MAPPINGS = ['records']
 
 """
+
+SEARCH_CREATE_CONCURRENCY = None
+"""Number of indices created in parallel by ``flask index init``.
+
+If `None` (or ``1``) the indices and aliases are created one after another.
+With a higher value, the index creation requests are sent from a pool of
+that many worker threads. The aliases are added once all indices exist.
+"""
+
+SEARCH_ALIAS_ACTIONS_CHUNK_SIZE = None
+"""Maximum number of alias actions sent in one ``_aliases`` request.
+
+If `None` all the aliases are added (or removed) with a single request, which
+makes switching the aliases atomic. Set it to split very large alias trees
+into several requests.
+"""
+
+SEARCH_INDEX_GENERATIONS = False
+"""Create versioned physical indices behind the registered index names.
+
+If `True`, every index is created with a generation suffix (e.g.
+``records-record-v1.0.0-1514764800000``) and the name built from the mapping
+file becomes an alias to it. This allows to rebuild all indices without
+downtime with:
+
+.. code-block:: console
+
+    $ flask index reindex --yes-i-know
+"""
+
+SEARCH_SINGLE_FLIGHT = False
+"""Share one request among identical concurrent searches.
+
+If `True`, a ``RecordsSearch`` executed while an identical search (same
+index, document types, parameters and body) is in progress in the same
+process waits for it and gets the same response instead of sending another
+request to Elasticsearch.
+"""
+
+SEARCH_HEDGING = None
+"""Hedged requests of ``RecordsSearch.execute()``.
+
+If set, a search without response after a percentile of the latencies of
+the recent searches of the same indices is sent again with another
+``preference``, so that a single slow replica does not delay it, and the
+first response is used. The other request is not aborted, its response is
+discarded. Searches keep their ``with_preference_param()`` replica unless
+they are slow. It is a dictionary with the parameters, e.g.:
+
+.. code-block:: python
+
+    SEARCH_HEDGING = {
+        'percentile': 95,  # percentile of the latencies
+        'min_delay': 0.01,  # minimum delay in seconds
+        'min_samples': 100,  # latencies recorded before hedging
+        'window': 1000,  # latencies kept per index
+    }
+
+Use ``{}`` for these default parameters. Searches with ``Meta.hedge =
+False`` are never hedged. If `None`, requests are not hedged.
+"""
+
+SEARCH_PREFERENCE_HASH = None
+"""Hash function of the ``preference`` of ``with_preference_param()``.
+
+It is a function, or its import path, called with the bytes identifying the
+user (IP address and User-Agent) and returning an integer or a hexadecimal
+digest, e.g. ``'zlib:crc32'`` for a fast non-cryptographic hash. The
+preference is computed once per request. If `None`, the MD5 digest is used.
+"""
+
+SEARCH_PREFERENCE_BUCKETS = None
+"""Number of preference groups of ``with_preference_param()``.
+
+If set, the users are spread over this number of preferences (e.g. the
+number of replicas) instead of having one each, so that the searches of
+different users hit the same shard copies and share their request caches.
+If `None`, each user has their own preference.
+"""
+
+SEARCH_RESULT_CACHE = None
+"""Cache of the responses of ``RecordsSearch.execute()``.
+
+It can be an object with ``get(key)`` and ``set(key, value, timeout)``
+methods (e.g. a cache shared between processes), a class or factory
+returning one, or its import path, e.g.
+``'invenio_search.cache:LRUSearchCache'``. If `None`, responses are not
+cached. Responses are stored as JSON strings. The pages fetched by
+``stream()`` and ``fetch_many()`` are not cached.
+
+Cached responses are not used anymore after any write done through this
+module (``flask index`` commands, ``BulkIndexer``...). Other writes are only
+seen once the cached responses expire.
+"""
+
+SEARCH_RESULT_CACHE_TIMEOUT = 60
+"""Number of seconds the search responses are cached."""
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Connection classes for the Elasticsearch client.
+
+See ``SEARCH_CLIENT_CONFIG``.
+"""
+
+from __future__ import absolute_import, print_function
+
+from elasticsearch.connection import \
+    RequestsHttpConnection as _RequestsHttpConnection
+from requests.adapters import HTTPAdapter
+
+
+class RequestsHttpConnection(_RequestsHttpConnection):
+    """Connection based on ``requests`` with a configurable pool size.
+
+    Unlike the connection of ``elasticsearch-py``, it honors the ``maxsize``
+    parameter, like ``Urllib3HttpConnection`` does.
+    """
+
+    def __init__(self, maxsize=10, **kwargs):
+        """Initialize the connection.
+
+        :param maxsize: Maximum number of connections kept open to the host.
+        """
+        super(RequestsHttpConnection, self).__init__(**kwargs)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
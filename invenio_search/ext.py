@@ -29,17 +29,125 @@ from __future__ import absolute_import, print_function
 import errno
 import json
 import os
+import threading
+import time
+import uuid
 import warnings
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 from elasticsearch import VERSION as ES_VERSION
 from pkg_resources import iter_entry_points, resource_filename, \
     resource_isdir, resource_listdir
-from werkzeug.utils import cached_property
+from werkzeug.utils import cached_property, import_string
 
 from . import config
 from .cli import index as index_cmd
-from .proxies import current_search_client
-from .utils import build_index_name
+from .utils import build_generation_name, build_index_name
+
+
+def _flatten_aliases(tree):
+    """Flatten a tree of aliases by walking DFS.
+
+    :param tree: Dictionary of aliases and mapping files.
+    :returns: A tuple with a list of ``(index, mapping_file)`` and a list of
+        ``(alias, indices)``, where ``indices`` are all the indices below the
+        alias, including the ones of nested aliases.
+    """
+    indices, aliases = [], []
+
+    def _walk(tree_or_filename, alias=None):
+        alias_indices = []
+        for name, value in tree_or_filename.items():
+            if isinstance(value, dict):
+                alias_indices.extend(_walk(value, alias=name))
+            else:
+                indices.append((name, value))
+                alias_indices.append(name)
+        if alias:
+            aliases.append((alias, alias_indices))
+        return alias_indices
+
+    _walk(tree)
+    return indices, aliases
+
+
+def _load_object(value):
+    """Import and instantiate an object set in the configuration.
+
+    :param value: An instance, a class or factory, or an import path.
+    :returns: The instance.
+    """
+    if isinstance(value, str):
+        value = import_string(value)
+    if isinstance(value, type):
+        value = value()
+    return value
+
+
+def _worker_threads():
+    """Return the number of threads of the uWSGI worker, if known."""
+    try:
+        import uwsgi
+    except ImportError:
+        return None
+    try:
+        return int(uwsgi.opt.get('threads'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _alias_path(tree, name):
+    """Return the names of the aliases above an alias or index, and itself.
+
+    :param tree: Dictionary of aliases and mapping files.
+    :param name: The alias or index name.
+    :returns: The list of names from the root of the tree to ``name``, or
+        ``None`` if the name is not in the tree.
+    """
+    for key, value in tree.items():
+        if key == name:
+            return [key]
+        if isinstance(value, dict):
+            path = _alias_path(value, name)
+            if path is not None:
+                return [key] + path
+    return None
+
+
+def _find_alias(tree, name):
+    """Return the subtree of an alias or index with the given name.
+
+    :param tree: Dictionary of aliases and mapping files.
+    :param name: The alias or index name.
+    :returns: The dictionary below the alias, a dictionary with only the
+        index, or ``None`` if the name is not in the tree.
+    """
+    for key, value in tree.items():
+        if key == name:
+            return value if isinstance(value, dict) else {key: value}
+        if isinstance(value, dict):
+            result = _find_alias(value, name)
+            if result is not None:
+                return result
+    return None
+
+
+_CACHE_GENERATION_KEY = 'invenio-search:generation'
+
+_READ_CLIENT = 'invenio-search:read'
+"""Key of the read client among the clients of the clusters."""
+
+
+def _cluster_label(cluster):
+    """Return the name of a cluster in metrics and error messages."""
+    if cluster is None:
+        return 'default'
+    if cluster == _READ_CLIENT:
+        return 'read'
+    return cluster
 
 
 class _SearchState(object):
@@ -56,17 +164,128 @@ class _SearchState(object):
             The entrypoint group name to load mappings.
         :param entry_point_group_templates:
             The entrypoint group name to load templates.
+        :param client: The client of the default cluster, used instead of
+            building one.
+        :param clients: Dictionary with the clients of other clusters, used
+            instead of building them.
+        :param read_client: The client for searches, used instead of building
+            one from ``SEARCH_READ_HOSTS``.
+        :param async_clients: Dictionary with the asynchronous clients of the
+            clusters (``None`` for the default one), used instead of building
+            them.
         """
         self.app = app
         self.mappings = {}
         self.aliases = {}
         self.number_of_indexes = 0
         self._client = kwargs.get('client')
+        self._clients = dict(kwargs.get('clients') or {})
+        if kwargs.get('read_client') is not None:
+            self._clients[_READ_CLIENT] = kwargs['read_client']
+        self._async_clients_given = dict(kwargs.get('async_clients') or {})
+        self._clients_lock = threading.RLock()
+        self._reset_clients()
         self.entry_point_group_templates = entry_point_group_templates
 
         if entry_point_group_mappings:
             self.load_entry_point_group_mappings(entry_point_group_mappings)
 
+    @cached_property
+    def result_cache(self):
+        """Return the search result cache or ``None`` if disabled."""
+        cache = _load_object(self.app.config.get('SEARCH_RESULT_CACHE'))
+        if cache is not None and not hasattr(cache, 'get'):
+            cache = cache()
+        return cache
+
+    @cached_property
+    def retry_policy(self):
+        """Return the retry policy of index management requests.
+
+        Its ``retries`` attribute counts the requests retried so far (see
+        ``SEARCH_RETRY``).
+        """
+        from .retry import RetryPolicy
+
+        config = self.app.config.get('SEARCH_RETRY')
+        if config is None:
+            return RetryPolicy(attempts=1)
+        return RetryPolicy(logger=self.app.logger, **config)
+
+    def retry(self, func, *args, **kwargs):
+        """Call a client method, retrying it on transient errors.
+
+        .. code-block:: python
+
+            current_search.retry(client.indices.refresh, index='records')
+
+        :param func: The client method.
+        :param idempotent: Set to ``False`` for requests which must not be
+            sent twice, e.g. indexing a document without identifier.
+        :returns: The response of the request.
+        """
+        return self.retry_policy.call(func, *args, **kwargs)
+
+    def retry_create(self, func, **kwargs):
+        """Create an index or a document, retrying on transient errors.
+
+        An attempt whose response was lost (e.g. timed out) may still have
+        created the index or document, so once the request was retried, an
+        "already exists" error (or a version conflict) means that it was
+        created.
+
+        .. code-block:: python
+
+            current_search.retry_create(client.indices.create,
+                                        index='records', body=mapping)
+
+        :param func: The client method, ``client.indices.create`` or
+            ``client.create`` (or ``client.index`` with ``op_type='create'``).
+        :param kwargs: Arguments of the client method.
+        :returns: The response of the request, or the body of the "already
+            exists" error.
+        """
+        from elasticsearch.exceptions import TransportError
+
+        from .retry import is_already_exists
+
+        attempts = []
+
+        def _create():
+            attempts.append(None)
+            try:
+                return func(**kwargs)
+            except TransportError as exc:
+                if len(attempts) > 1 and is_already_exists(exc):
+                    return exc.info
+                raise
+
+        return self.retry(_create)
+
+    @property
+    def cache_generation(self):
+        """Return the current generation of the cached search results."""
+        cache = self.result_cache
+        if cache is None:
+            return None
+        generation = cache.get(_CACHE_GENERATION_KEY)
+        if generation is None:
+            generation = self.invalidate_cache()
+        return generation
+
+    def invalidate_cache(self):
+        """Start a new generation of cached search results.
+
+        Results cached before are not used anymore. It is called after
+        writes done by this module.
+        """
+        cache = self.result_cache
+        if cache is None:
+            return None
+        generation = uuid.uuid4().hex
+        cache.set(_CACHE_GENERATION_KEY, generation)
+        return generation
+
     @cached_property
     def templates(self):
         result = None
@@ -191,22 +410,282 @@ class _SearchState(object):
                     result.append(self.register_templates(template_dir))
         return result
 
-    def _client_builder(self):
-        """Build Elasticsearch client."""
+    def _client_kwargs(self, cluster=None):
+        """Return the keyword arguments of the client of a cluster.
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        """
+        kwargs = dict(self.app.config.get('SEARCH_CLIENT_CONFIG') or {})
+        if cluster == _READ_CLIENT:
+            kwargs['hosts'] = self.app.config['SEARCH_READ_HOSTS']
+        elif cluster is not None:
+            kwargs.update(self.app.config['SEARCH_CLUSTERS'][cluster])
+        kwargs.setdefault('hosts', self.app.config.get('SEARCH_ELASTIC_HOSTS'))
+        kwargs.setdefault('maxsize', max(10, _worker_threads() or 0))
+
+        if kwargs.pop('http_compress', True):
+            headers = dict(kwargs.get('headers') or {})
+            headers.setdefault('accept-encoding', 'gzip,deflate')
+            kwargs['headers'] = headers
+
+        serializer = _load_object(
+            self.app.config.get('SEARCH_CLIENT_SERIALIZER'))
+        if serializer is not None:
+            kwargs.setdefault('serializer', serializer)
+        return kwargs
+
+    def _client_builder(self, cluster=None):
+        """Build Elasticsearch client.
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        """
         from elasticsearch import Elasticsearch
-        from elasticsearch.connection import RequestsHttpConnection
 
-        return Elasticsearch(
-            hosts=self.app.config.get('SEARCH_ELASTIC_HOSTS'),
-            connection_class=RequestsHttpConnection,
-        )
+        from .connection import RequestsHttpConnection
+
+        kwargs = self._client_kwargs(cluster=cluster)
+        connection_class = kwargs.get('connection_class',
+                                      RequestsHttpConnection)
+        if isinstance(connection_class, str):
+            connection_class = import_string(connection_class)
+        kwargs['connection_class'] = connection_class
+
+        if self.app.config.get('SEARCH_CIRCUIT_BREAKER') is not None:
+            from .breaker import CircuitBreakerTransport
+            kwargs.setdefault('transport_class', CircuitBreakerTransport)
+            kwargs['breakers'] = self.get_breakers(cluster)
+
+        return Elasticsearch(**kwargs)
+
+    def _async_client_builder(self, cluster=None, loop=None):
+        """Build asynchronous Elasticsearch client.
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        :param loop: The event loop of the client.
+        """
+        from elasticsearch_async import AsyncElasticsearch
+
+        from .aio import _connection_class
+
+        kwargs = self._client_kwargs(cluster=cluster)
+        kwargs.pop('connection_class', None)
+        # The pool is shared by coroutines rather than threads.
+        kwargs['maxsize'] = 100
+        kwargs.update(self.app.config.get('SEARCH_ASYNC_CLIENT_CONFIG') or {})
+        if isinstance(kwargs.get('connection_class'), str):
+            kwargs['connection_class'] = import_string(
+                kwargs['connection_class'])
+        kwargs.setdefault('connection_class', _connection_class())
+
+        return AsyncElasticsearch(loop=loop, **kwargs)
+
+    def _reset_clients(self):
+        """Forget the clients built so far, without closing them."""
+        self._clients_pid = os.getpid()
+        self._process_clients = {}
+        self._thread_clients = threading.local()
+        self._built_clients = weakref.WeakSet()
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._breakers = {}
+
+    def _build_client(self, cluster=None):
+        """Build a client and keep track of it to close it later."""
+        client = self._client_builder(cluster=cluster)
+        with self._clients_lock:
+            self._built_clients.add(client)
+        return client
+
+    def _check_pid(self):
+        """Forget the clients of the parent process in a forked process."""
+        if self._clients_pid != os.getpid():
+            with self._clients_lock:
+                if self._clients_pid != os.getpid():
+                    # The connections still belong to the parent process.
+                    self._reset_clients()
+
+    def get_client(self, cluster=None):
+        """Return the client of a cluster.
+
+        The client is built once per process, or once per thread if
+        ``SEARCH_CLIENT_PER_THREAD`` is set. A process forked after the
+        client was built (e.g. a uWSGI, Gunicorn or Celery worker) builds its
+        own client instead of sharing the pooled connections of its parent.
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        """
+        if cluster is None and self._client is not None:
+            return self._client
+        if cluster in self._clients:
+            return self._clients[cluster]
+
+        self._check_pid()
+
+        if self.app.config.get('SEARCH_CLIENT_PER_THREAD'):
+            clients = getattr(self._thread_clients, 'clients', None)
+            if clients is None:
+                clients = self._thread_clients.clients = {}
+            if cluster not in clients:
+                clients[cluster] = self._build_client(cluster=cluster)
+            return clients[cluster]
+
+        if cluster not in self._process_clients:
+            with self._clients_lock:
+                if cluster not in self._process_clients:
+                    self._process_clients[cluster] = self._build_client(
+                        cluster=cluster)
+        return self._process_clients[cluster]
+
+    def get_breakers(self, cluster=None):
+        """Return the circuit breakers of a cluster by endpoint type.
+
+        They are shared by all the clients of the cluster in this process
+        (see ``SEARCH_CIRCUIT_BREAKER``).
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        """
+        from .breaker import ENDPOINT_TYPES, CircuitBreaker
+
+        self._check_pid()
+        with self._clients_lock:
+            if cluster not in self._breakers:
+                config = self.app.config.get('SEARCH_CIRCUIT_BREAKER')
+                config = config if isinstance(config, dict) else {}
+                defaults = dict((key, value) for key, value in config.items()
+                                if key not in ENDPOINT_TYPES)
+                breakers = {}
+                for type_ in ENDPOINT_TYPES:
+                    kwargs = dict(defaults, **config.get(type_, {}))
+                    breakers[type_] = CircuitBreaker(
+                        '{0}:{1}'.format(_cluster_label(cluster), type_),
+                        **kwargs)
+                self._breakers[cluster] = breakers
+            return self._breakers[cluster]
+
+    def breaker_stats(self):
+        """Return the state of the circuit breakers, for metrics.
+
+        :returns: A dictionary of cluster names (``'default'`` and
+            ``'read'`` for the default cluster and its read client) to
+            dictionaries of endpoint types to the statistics of their
+            breaker (see :meth:`~invenio_search.breaker.CircuitBreaker.stats`).
+        """
+        with self._clients_lock:
+            breakers = list(self._breakers.items())
+        return dict(
+            (_cluster_label(cluster), dict(
+                (type_, breaker.stats()) for type_, breaker in items.items()))
+            for cluster, items in breakers)
 
     @property
     def client(self):
         """Return client for current application."""
-        if self._client is None:
-            self._client = self._client_builder()
-        return self._client
+        return self.get_client()
+
+    @property
+    def read_client(self):
+        """Return the client for searches in the default cluster.
+
+        It has its own connection pool to ``SEARCH_READ_HOSTS``. If they are
+        not set, the default client is returned.
+        """
+        if _READ_CLIENT in self._clients or \
+                self.app.config.get('SEARCH_READ_HOSTS'):
+            return self.get_client(_READ_CLIENT)
+        return self.client
+
+    def get_async_client(self, cluster=None):
+        """Return the asynchronous client of a cluster.
+
+        The client is built once per event loop, with its own connection
+        pool. It requires the ``elasticsearch-async`` package.
+
+        :param cluster: The name of a cluster in ``SEARCH_CLUSTERS``, or
+            ``None`` for the default one.
+        """
+        import asyncio
+
+        if cluster in self._async_clients_given:
+            return self._async_clients_given[cluster]
+
+        self._check_pid()
+        loop = asyncio.get_event_loop()
+        with self._clients_lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if cluster not in clients:
+                clients[cluster] = self._async_client_builder(
+                    cluster=cluster, loop=loop)
+            return clients[cluster]
+
+    @property
+    def async_read_client(self):
+        """Return the asynchronous client for searches.
+
+        It uses ``SEARCH_READ_HOSTS`` if they are set.
+        """
+        if _READ_CLIENT in self._async_clients_given or \
+                self.app.config.get('SEARCH_READ_HOSTS'):
+            return self.get_async_client(_READ_CLIENT)
+        return self.get_async_client()
+
+    def _pop_async_clients(self, loop):
+        """Forget and return the asynchronous clients of an event loop."""
+        with self._clients_lock:
+            return list(self._async_clients.pop(loop, {}).values())
+
+    def cluster_for(self, name):
+        """Return the cluster of an alias, index or template.
+
+        The cluster is given by ``SEARCH_CLUSTER_ROUTING`` for the name or,
+        for registered aliases and indices, for the closest alias above it.
+
+        :param name: The alias, index or template name.
+        :returns: The name of a cluster in ``SEARCH_CLUSTERS``, or ``None``
+            for the default one.
+        """
+        routing = self.app.config.get('SEARCH_CLUSTER_ROUTING')
+        if not routing:
+            return None
+        for alias in reversed(_alias_path(self.aliases, name) or [name]):
+            if alias in routing:
+                return routing[alias]
+        return None
+
+    def client_for(self, name):
+        """Return the client of the cluster of an alias, index or template.
+
+        :param name: The alias, index or template name.
+        """
+        return self.get_client(self.cluster_for(name))
+
+    def _group_by_cluster(self, names):
+        """Group names by their cluster, keeping their order.
+
+        :param names: List of alias or index names.
+        :returns: A list of ``(cluster, names)`` tuples.
+        """
+        groups = OrderedDict()
+        for name in names:
+            groups.setdefault(self.cluster_for(name), []).append(name)
+        return list(groups.items())
+
+    def close(self):
+        """Close the connections of the clients built by this process.
+
+        Call it when a worker shuts down. The next use of :attr:`client`
+        builds a new client.
+        """
+        with self._clients_lock:
+            clients = list(self._built_clients)
+            forked = self._clients_pid != os.getpid()
+            self._reset_clients()
+        if not forked:
+            for client in clients:
+                client.transport.close()
 
     def flush_and_refresh(self, index):
         """Flush and refresh one or more indices.
@@ -216,12 +695,100 @@ class _SearchState(object):
            Do not call this method unless you know what you are doing. This
            method is only intended to be called during tests.
         """
-        self.client.indices.flush(wait_if_ongoing=True, index=index)
-        self.client.indices.refresh(index=index)
-        self.client.cluster.health(
+        client = self.client_for(index)
+        client.indices.flush(wait_if_ongoing=True, index=index)
+        client.indices.refresh(index=index)
+        client.cluster.health(
             wait_for_status='yellow', request_timeout=30)
         return True
 
+    @contextmanager
+    def bulk_load_mode(self, index=None):
+        """Disable refreshes and replicas of indices during a bulk load.
+
+        The ``refresh_interval`` and ``number_of_replicas`` settings of every
+        physical index are recorded, set to ``-1`` and ``0`` and restored
+        when leaving the context, even if an error occurred. The indices are
+        then refreshed once.
+
+        .. code-block:: python
+
+            with current_search.bulk_load_mode('records'):
+                with BulkIndexer() as indexer:
+                    ...
+
+        :param index: An active alias or index name. If it is a registered
+            alias, all the indices below it are used, if it is not
+            registered, it is passed as is to Elasticsearch. If ``None``,
+            all active indices are used.
+        """
+        tree = self.active_aliases
+        if index is not None:
+            tree = _find_alias(tree, index) or {index: None}
+        names = [name for name, _ in _flatten_aliases(tree)[0]]
+
+        original = []
+        try:
+            for cluster, cluster_names in self._group_by_cluster(names):
+                client = self.get_client(cluster)
+                response = self.retry(client.indices.get_settings,
+                                      index=cluster_names, flat_settings=True)
+                settings = {}
+                for physical, data in response.items():
+                    settings[physical] = {
+                        # An unset interval is reset to the default.
+                        'index.refresh_interval': data['settings'].get(
+                            'index.refresh_interval'),
+                        'index.number_of_replicas': data['settings'][
+                            'index.number_of_replicas'],
+                    }
+                if settings:
+                    original.append((client, settings))
+                    self.retry(
+                        client.indices.put_settings,
+                        index=sorted(settings),
+                        body={'index.refresh_interval': '-1',
+                              'index.number_of_replicas': 0},
+                    )
+            yield
+        except BaseException:
+            for physical, error in self._restore_settings(original):
+                self.app.logger.error(
+                    'Restoring the settings of index "%s" failed: %s',
+                    physical, error)
+            raise
+
+        errors = self._restore_settings(original)
+        if errors:
+            raise RuntimeError(
+                'Restoring the settings of indices failed: {0}'.format(
+                    ', '.join('{0} ({1})'.format(physical, error)
+                              for physical, error in errors)))
+
+    def _restore_settings(self, original):
+        """Restore the index settings changed by :meth:`bulk_load_mode`.
+
+        Every index is restored and refreshed, even if some of them fail.
+
+        :param original: List of ``(client, settings)`` tuples, with the
+            settings of each physical index.
+        :returns: A list of ``(index, exception)`` tuples for the failures.
+        """
+        errors = []
+        for client, settings in original:
+            for physical, index_settings in sorted(settings.items()):
+                try:
+                    self.retry(client.indices.put_settings, index=physical,
+                               body=index_settings)
+                except Exception as exc:
+                    errors.append((physical, exc))
+            try:
+                self.retry(client.indices.refresh, index=sorted(settings))
+            except Exception as exc:
+                errors.append((','.join(sorted(settings)), exc))
+        self.invalidate_cache()
+        return errors
+
     @property
     def active_aliases(self):
         """Get a filtered list of aliases based on configuration.
@@ -237,79 +804,376 @@ class _SearchState(object):
             return {k: v for k, v in self.aliases.items()
                     if k in whitelisted_aliases}
 
-    def create(self, ignore=None):
-        """Yield tuple with created index name and responses from a client."""
-        ignore = ignore or []
+    def _update_aliases(self, action, aliases, physical, ignore=None):
+        """Yield tuple with alias name and response of a ``_aliases`` call.
 
-        def _create(tree_or_filename, alias=None):
-            """Create indices and aliases by walking DFS."""
-            # Iterate over aliases:
-            for name, value in tree_or_filename.items():
-                if isinstance(value, dict):
-                    for result in _create(value, alias=name):
-                        yield result
-                else:
-                    with open(value, 'r') as body:
-                        yield name, self.client.indices.create(
-                            index=name,
-                            body=json.load(body),
-                            ignore=ignore,
-                        )
-
-            if alias:
-                yield alias, self.client.indices.put_alias(
-                    index=list(tree_or_filename.keys()),
-                    name=alias,
+        All alias actions of a cluster are sent in a single request, so that
+        they are applied atomically, unless
+        ``SEARCH_ALIAS_ACTIONS_CHUNK_SIZE`` splits them into several
+        requests. An alias above indices of several clusters is updated in
+        each of them.
+
+        :param action: The alias action (``'add'`` or ``'remove'``).
+        :param aliases: List of ``(alias, names)`` tuples, where ``names`` are
+            the registered index names below the alias.
+        :param physical: Dictionary with the list of physical indices of
+            each registered index name.
+        :param ignore: List of HTTP status codes to ignore.
+        """
+        chunk_size = self.app.config.get('SEARCH_ALIAS_ACTIONS_CHUNK_SIZE')
+        pending = OrderedDict()
+
+        def _send(cluster):
+            actions, names = pending.pop(cluster)
+            response = None
+            if actions:
+                response = self.retry(
+                    self.get_client(cluster).indices.update_aliases,
+                    body={'actions': actions},
                     ignore=ignore,
                 )
+            return [(name, response) for name in names]
+
+        for alias, names in aliases:
+            groups = self._group_by_cluster(names) or \
+                [(self.cluster_for(alias), [])]
+            for cluster, cluster_names in groups:
+                actions, alias_names = pending.setdefault(cluster, ([], []))
+                indices = [index for name in cluster_names
+                           for index in physical[name]]
+                # An alias without indices below it has nothing to point to.
+                if indices:
+                    actions.append(
+                        {action: {'indices': indices, 'alias': alias}})
+                alias_names.append(alias)
+                if chunk_size and len(actions) >= chunk_size:
+                    for result in _send(cluster):
+                        yield result
+
+        while pending:
+            for result in _send(next(iter(pending))):
+                yield result
+
+    def _new_generation(self):
+        """Return a new, increasing, index generation suffix."""
+        return str(int(time.time() * 1000))
+
+    def _concrete_indices(self, names):
+        """Return the physical indices which the given aliases point to.
+
+        :param names: List of index names registered from mapping files.
+        :returns: Dictionary with a (possibly empty) list of physical indices
+            for each of the names.
+        """
+        result = dict((name, []) for name in names)
+        for cluster, cluster_names in self._group_by_cluster(names):
+            response = self.retry(
+                self.get_client(cluster).indices.get_alias,
+                name=cluster_names, ignore=[404])
+            for index, data in response.items():
+                if not isinstance(data, dict):
+                    continue
+                for alias in data.get('aliases', {}):
+                    if alias in result:
+                        result[alias].append(index)
+        for indices in result.values():
+            indices.sort()
+        return result
+
+    def _physical_indices(self, names):
+        """Return the physical indices of the given index names.
+
+        Without ``SEARCH_INDEX_GENERATIONS`` the index names are the physical
+        indices, otherwise the names are resolved as aliases.
+        """
+        if not self.app.config.get('SEARCH_INDEX_GENERATIONS'):
+            return dict((name, [name]) for name in names)
+        concrete = self._concrete_indices(names)
+        return dict((name, concrete[name] or [name]) for name in names)
+
+    def _existing_indices(self, names):
+        """Return the physical indices which already hold the given names.
+
+        :param names: List of index names registered from mapping files.
+        :returns: Dictionary with the generations of each name, or the name
+            itself if it is an index without generation, or an empty list.
+        """
+        existing = self._concrete_indices(names)
+        for name in names:
+            if not existing[name] and self.retry(
+                    self.client_for(name).indices.exists, index=name):
+                existing[name] = [name]
+        return existing
 
-        for result in _create(self.active_aliases):
+    def create(self, ignore=None, concurrency=None):
+        """Yield tuple with created index name and responses from a client.
+
+        The indices are created first and all the aliases are then added
+        with a single request. If ``SEARCH_INDEX_GENERATIONS`` is enabled,
+        each index is created with a generation suffix and the index name
+        is added as an alias to it. No generation is created for an index
+        name which already exists: its creation fails as without
+        generations (see ``ignore``).
+
+        :param ignore: List of HTTP status codes to ignore.
+        :param concurrency: Number of indices to create in parallel. If not
+            given, ``SEARCH_CREATE_CONCURRENCY`` is used. The tuples are
+            always yielded in the same order, regardless of its value.
+        """
+        ignore = ignore or []
+        if concurrency is None:
+            concurrency = self.app.config.get('SEARCH_CREATE_CONCURRENCY')
+
+        indices, aliases = _flatten_aliases(self.active_aliases)
+        physical = dict((name, name) for name, _ in indices)
+        existing = {}
+        if self.app.config.get('SEARCH_INDEX_GENERATIONS'):
+            generation = self._new_generation()
+            existing = self._existing_indices(list(physical))
+            physical = dict(
+                (name, name if existing[name]
+                 else build_generation_name(name, generation))
+                for name in physical)
+
+        def _create(item):
+            name, filename = item
+            with open(filename, 'r') as body:
+                body = json.load(body)
+            if physical[name] != name:
+                body.setdefault('aliases', {})[name] = {}
+            return name, self.retry_create(
+                self.client_for(name).indices.create,
+                index=physical[name],
+                body=body,
+                ignore=ignore,
+            )
+
+        pool = None
+        if concurrency and concurrency > 1:
+            pool = ThreadPool(processes=concurrency)
+            results = pool.imap(_create, indices)
+        else:
+            results = (_create(item) for item in indices)
+
+        try:
+            for result in results:
+                yield result
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        physical = dict((name, existing.get(name) or [index])
+                        for name, index in physical.items())
+        for result in self._update_aliases('add', aliases, physical,
+                                           ignore=ignore):
             yield result
+        self.invalidate_cache()
+
+    def _copy_index(self, source, target, server_side=True, slices=1,
+                    chunk_size=500, poll_interval=5, client=None):
+        """Copy all documents from one index to another one.
+
+        :param source: The source index.
+        :param target: The target index.
+        :param server_side: Use the ``_reindex`` API if ``True``, otherwise
+            scan the source and bulk index the documents from the client.
+        :param slices: Number of slices to copy in parallel.
+        :param chunk_size: Number of documents per scroll and bulk request.
+        :param poll_interval: Seconds between checks of the reindex task.
+        :param client: The client of the cluster of both indices (default:
+            the default client).
+        """
+        from elasticsearch.helpers import bulk, scan
+
+        client = client or self.client
+
+        if server_side:
+            params = {'slices': slices} if slices > 1 else {}
+            task = client.reindex(
+                body={'source': {'index': source, 'size': chunk_size},
+                      'dest': {'index': target}},
+                wait_for_completion=False,
+                **params
+            )['task']
+            while True:
+                status = client.tasks.get(task_id=task)
+                if status.get('completed'):
+                    break
+                time.sleep(poll_interval)
+            response = status.get('response')
+            if status.get('error') or not response or \
+                    response.get('failures'):
+                raise RuntimeError(
+                    'Copying index "{0}" to "{1}" failed: {2}'.format(
+                        source, target, status.get('error') or
+                        (response or {}).get('failures')))
+            return response
+
+        def _action(hit):
+            action = {'_index': target,
+                      '_type': hit['_type'],
+                      '_id': hit['_id'],
+                      '_source': hit['_source']}
+            for field in ('_routing', '_parent'):
+                value = hit.get(field, hit.get('fields', {}).get(field))
+                if value is not None:
+                    action[field] = value
+            return action
+
+        def _copy_slice(slice_id):
+            query = None
+            if slices > 1:
+                query = {'slice': {'id': slice_id, 'max': slices}}
+            hits = scan(client, index=source, query=query, size=chunk_size)
+            return bulk(client, (_action(hit) for hit in hits),
+                        chunk_size=chunk_size)[0]
+
+        if slices > 1:
+            pool = ThreadPool(processes=slices)
+            try:
+                created = pool.map(_copy_slice, range(slices))
+            finally:
+                pool.terminate()
+        else:
+            created = [_copy_slice(0)]
+        return {'created': sum(created)}
+
+    def reindex(self, server_side=True, slices=1, chunk_size=500):
+        """Yield tuple with index name and response of reindexing it.
+
+        Every registered index is created again with a new generation
+        suffix and the documents are copied from the current generation.
+        Once all the indices are copied, the aliases are switched in a single
+        atomic request and the old generations are deleted. If a copy failed
+        or is incomplete, the new generations are deleted instead and the
+        error is raised.
+
+        .. note::
+
+           Documents written to the old generation while it is being copied
+           are not present in the new one.
+
+        :param server_side: Use the ``_reindex`` API if ``True``, otherwise
+            scan the old index and bulk index the documents from the client.
+        :param slices: Number of slices to copy in parallel.
+        :param chunk_size: Number of documents per scroll and bulk request.
+        """
+        indices, aliases = _flatten_aliases(self.active_aliases)
+        current = self._concrete_indices([name for name, _ in indices])
+        generation = self._new_generation()
+        created = []
+        actions = OrderedDict()
+        responses = {}
+
+        try:
+            for name, filename in indices:
+                cluster = self.cluster_for(name)
+                client = self.get_client(cluster)
+                if not current[name] and client.indices.exists(index=name):
+                    raise RuntimeError(
+                        'Index "{0}" has no generations. Recreate it with '
+                        'SEARCH_INDEX_GENERATIONS enabled.'.format(name))
+
+                new_index = build_generation_name(name, generation)
+                with open(filename, 'r') as body:
+                    self.retry_create(client.indices.create,
+                                      index=new_index, body=json.load(body))
+                created.append((client, new_index))
+
+                response = None
+                for old_index in current[name]:
+                    response = self._copy_index(
+                        old_index, new_index, server_side=server_side,
+                        slices=slices, chunk_size=chunk_size, client=client)
+                self.retry(client.indices.refresh, index=new_index)
+
+                # Never switch to an incomplete copy.
+                expected = sum(
+                    self.retry(client.count, index=old_index)['count']
+                    for old_index in current[name])
+                copied = self.retry(client.count, index=new_index)['count']
+                if copied != expected:
+                    raise RuntimeError(
+                        'Index "{0}" has {1} documents but {2} were copied '
+                        'to "{3}".'.format(name, expected, copied, new_index))
+
+                cluster_actions = actions.setdefault(cluster, [])
+                for alias in [name] + [alias for alias, alias_indices
+                                       in aliases if name in alias_indices]:
+                    cluster_actions.extend(
+                        {'remove': {'index': old, 'alias': alias}}
+                        for old in current[name])
+                    cluster_actions.append({'add': {'index': new_index,
+                                                    'alias': alias}})
+                yield name, response
+
+            # The aliases are switched atomically in each cluster.
+            for cluster, cluster_actions in actions.items():
+                responses[cluster] = self.retry(
+                    self.get_client(cluster).indices.update_aliases,
+                    body={'actions': cluster_actions})
+        except Exception:
+            for client, index in created:
+                client.indices.delete(index=index, ignore=[404])
+            raise
+
+        for alias, alias_indices in aliases:
+            clusters = [cluster for cluster, _
+                        in self._group_by_cluster(alias_indices)]
+            yield alias, responses.get(
+                clusters[0] if clusters else self.cluster_for(alias))
+
+        for name, _ in indices:
+            client = self.client_for(name)
+            for old_index in current[name]:
+                self.retry(client.indices.delete, index=old_index,
+                           ignore=[404])
+        self.invalidate_cache()
 
     def put_templates(self, ignore=None):
-        """Yield tuple with registered template and response from client."""
+        """Yield tuple with registered template and response from client.
+
+        Each template is put in the cluster given by ``cluster_for()`` for its
+        name.
+        """
         ignore = ignore or []
 
         def _put_template(template):
             """Put template in search client."""
             with open(self.templates[template], 'r') as body:
-                return self.templates[template],\
-                    current_search_client.indices.put_template(
-                        name=template,
-                        body=json.load(body),
-                        ignore=ignore,
+                return self.templates[template], self.retry(
+                    self.client_for(template).indices.put_template,
+                    name=template,
+                    body=json.load(body),
+                    ignore=ignore,
                 )
 
         for template in self.templates:
             yield _put_template(template)
 
     def delete(self, ignore=None):
-        """Yield tuple with deleted index name and responses from a client."""
-        ignore = ignore or []
-
-        def _delete(tree_or_filename, alias=None):
-            """Delete indexes and aliases by walking DFS."""
-            if alias:
-                yield alias, self.client.indices.delete_alias(
-                    index=list(tree_or_filename.keys()),
-                    name=alias,
-                    ignore=ignore,
-                )
+        """Yield tuple with deleted index name and responses from a client.
 
-            # Iterate over aliases:
-            for name, value in tree_or_filename.items():
-                if isinstance(value, dict):
-                    for result in _delete(value, alias=name):
-                        yield result
-                else:
-                    yield name, self.client.indices.delete(
-                        index=name,
-                        ignore=ignore,
-                    )
+        All the aliases are removed with a single request before deleting
+        the indices. If ``SEARCH_INDEX_GENERATIONS`` is enabled, all the
+        generations of each index are deleted.
+        """
+        ignore = ignore or []
+        indices, aliases = _flatten_aliases(self.active_aliases)
+        physical = self._physical_indices([name for name, _ in indices])
 
-        for result in _delete(self.active_aliases):
+        for result in self._update_aliases('remove', aliases, physical,
+                                           ignore=ignore):
             yield result
 
+        for name, _ in indices:
+            yield name, self.retry(
+                self.client_for(name).indices.delete,
+                index=physical[name],
+                ignore=ignore,
+            )
+        self.invalidate_cache()
+
 
 class InvenioSearch(object):
     """Invenio-Search extension."""
@@ -319,8 +1183,6 @@ class InvenioSearch(object):
 
         :param app: An instance of :class:`~flask.app.Flask`.
         """
-        self._clients = {}
-
         if app:
             self.init_app(app, **kwargs)
 
@@ -38,5 +38,11 @@ def _get_current_search_client():
     return _get_current_search().client
 
 
+def _get_current_search_read_client():
+    """Return current search read client."""
+    return _get_current_search().read_client
+
+
 current_search = LocalProxy(_get_current_search)
 current_search_client = LocalProxy(_get_current_search_client)
+current_search_read_client = LocalProxy(_get_current_search_read_client)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Retry policy for transient Elasticsearch errors.
+
+See ``SEARCH_RETRY``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import random
+import threading
+import time
+
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, \
+    TransportError
+
+from .breaker import CircuitBreakerOpen
+
+_ALREADY_EXISTS_ERRORS = ('resource_already_exists_exception',
+                          'index_already_exists_exception')
+
+
+def is_already_exists(exception):
+    """Return if the creation of an index or document failed as it exists."""
+    status = getattr(exception, 'status_code', None)
+    return status == 409 or (
+        status == 400 and
+        getattr(exception, 'error', None) in _ALREADY_EXISTS_ERRORS)
+
+
+class RetryPolicy(object):
+    """Retry requests with exponential backoff and jitter.
+
+    A request failing with a connection error or one of the retryable status
+    codes is sent again after ``backoff_base * 2 ** (retry - 1)`` seconds, at
+    most ``backoff_cap`` seconds. With ``jitter``, a random delay between
+    zero and this value is used instead ("full jitter"), so that the clients
+    of a restarting cluster do not retry all at the same time. Requests
+    refused by an open circuit breaker are not retried, and neither are
+    timed out requests which are not idempotent, as they may have been
+    processed.
+    """
+
+    def __init__(self, attempts=5, backoff_base=0.5, backoff_cap=30,
+                 jitter=True, statuses=(429, 503), logger=None):
+        """Initialize the policy.
+
+        :param attempts: Maximum number of attempts of a request, including
+            the first one.
+        :param backoff_base: Seconds before the first retry.
+        :param backoff_cap: Maximum number of seconds between two attempts.
+        :param jitter: Randomize the delays between attempts.
+        :param statuses: HTTP status codes of the errors to retry.
+        :param logger: Logger warned about each retry.
+        """
+        self.attempts = max(1, attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.logger = logger
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def is_retryable(self, exception, idempotent=True):
+        """Return if a request failing with the exception can be retried.
+
+        :param exception: The error of the request.
+        :param idempotent: If sending the request twice has the same effect
+            as sending it once.
+        """
+        if isinstance(exception, CircuitBreakerOpen):
+            return False
+        if isinstance(exception, ConnectionTimeout):
+            return idempotent
+        if isinstance(exception, ConnectionError):
+            return True
+        return getattr(exception, 'status_code', None) in self.statuses
+
+    def backoff(self, retry):
+        """Return the number of seconds to wait before a retry.
+
+        :param retry: The number of the retry, starting at 1.
+        """
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** (retry - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def call(self, func, *args, **kwargs):
+        """Call a function, retrying it on transient errors.
+
+        :param func: The function sending the request, e.g.
+            ``client.indices.refresh``.
+        :param idempotent: Keyword argument (not passed to the function)
+            telling if the request is idempotent (default: ``True``). Timed
+            out requests are only retried if it is.
+        :returns: The return value of the function.
+        """
+        idempotent = kwargs.pop('idempotent', True)
+        retry = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except TransportError as exc:
+                retry += 1
+                if retry >= self.attempts or \
+                        not self.is_retryable(exc, idempotent=idempotent):
+                    raise
+                delay = self.backoff(retry)
+                with self._lock:
+                    self.retries += 1
+                if self.logger is not None:
+                    self.logger.warning(
+                        'Retrying Elasticsearch request in %.2fs '
+                        '(attempt %d of %d): %s',
+                        delay, retry + 1, self.attempts, exc)
+                time.sleep(delay)
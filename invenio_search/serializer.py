@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Serializers for the Elasticsearch client.
+
+See ``SEARCH_CLIENT_SERIALIZER``.
+"""
+
+from __future__ import absolute_import, print_function
+
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONSerializer(JSONSerializer):
+    """JSON serializer using ``orjson`` when it is installed.
+
+    Install it with ``pip install invenio-search[orjson]``. Without it, the
+    standard serializer of ``elasticsearch-py`` is used. Dates, datetimes,
+    decimals and UUIDs are serialized like the standard serializer does
+    (ISO 8601 strings, numbers and strings).
+    """
+
+    def __init__(self, backend=None):
+        """Initialize the serializer.
+
+        :param backend: ``'orjson'`` or ``'json'`` (default: ``'orjson'`` if
+            it is installed).
+        """
+        if backend is None:
+            backend = 'orjson' if orjson is not None else 'json'
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('orjson is not installed.')
+        self.backend = backend
+
+    def loads(self, s):
+        """Parse a JSON document."""
+        if self.backend != 'orjson':
+            return super(FastJSONSerializer, self).loads(s)
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        """Serialize data to a JSON string, leaving strings unchanged."""
+        if self.backend != 'orjson' or isinstance(data, (str, bytes)):
+            return super(FastJSONSerializer, self).dumps(data)
+        try:
+            return orjson.dumps(
+                data, default=self.default,
+                option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except (ValueError, TypeError) as e:
+            raise SerializationError(data, e)
@@ -30,6 +30,19 @@ def build_index_name(*parts):
     return os.path.splitext('-'.join([part for part in parts if part]))[0]
 
 
+def build_generation_name(index_name, generation):
+    """Build the name of a physical index for an index generation.
+
+    >>> from invenio_search.utils import build_generation_name
+    >>> build_generation_name('records-record-v1.0.0', '1514764800000')
+    'records-record-v1.0.0-1514764800000'
+
+    :param index_name: The index name built from the mapping file.
+    :param generation: The generation suffix.
+    """
+    return '{0}-{1}'.format(index_name, generation)
+
+
 def schema_to_index(schema, index_names=None):
     """Get index/doc_type given a schema URL.
 
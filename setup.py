@@ -52,7 +52,7 @@ extras_require = {
     # Elasticsearch version
     'elasticsearch2': [
         'elasticsearch>=2.0.0,<3.0.0',
-        'elasticsearch-dsl>=2.0.0,<3.0.0',
+        'elasticsearch-dsl>=2.1.0,<3.0.0',
     ],
     'elasticsearch5': [
         'elasticsearch>=5.0.0,<6.0.0',
@@ -63,6 +63,12 @@ extras_require = {
     #     'elasticsearch>=6.0.0,<7.0.0',
     #     'elasticsearch-dsl>=5.4.0.dev0,<7.0.0',
     # ],
+    'async': [
+        'elasticsearch-async>=5.0.0,<6.0.0; python_version>="3.5"',
+    ],
+    'orjson': [
+        'orjson>=2.0.0; python_version>="3.6"',
+    ],
     'records': [
         'invenio-records>=1.0.0a4',
     ],
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Asynchronous search API tests."""
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+
+import pytest
+from elasticsearch.serializer import JSONSerializer
+from elasticsearch_dsl import Q
+from flask import Flask
+from mock import MagicMock
+
+from invenio_search import InvenioSearch
+from invenio_search.aio import AsyncMultiRecordsSearch, AsyncRecordsSearch, \
+    execute_searches
+
+
+def hit(id_, sort=None):
+    """Build a raw hit."""
+    return {'_index': 'records', '_type': 'record', '_id': str(id_),
+            '_source': {'title': str(id_)}, 'sort': sort or [id_]}
+
+
+class AsyncClient(object):
+    """Asynchronous client answering with canned responses."""
+
+    def __init__(self, pages=None):
+        """Initialize the client."""
+        self.transport = MagicMock(serializer=JSONSerializer())
+        self.pages = list(pages or [])
+        self.calls = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def _respond(self, method, **kwargs):
+        self.calls.append((method, kwargs))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.pages:
+            return self.pages.pop(0)
+        return {'hits': {'total': 0, 'hits': []}}
+
+    async def search(self, **kwargs):
+        return await self._respond('search', **kwargs)
+
+    async def scroll(self, **kwargs):
+        return await self._respond('scroll', **kwargs)
+
+    async def clear_scroll(self, **kwargs):
+        self.calls.append(('clear_scroll', kwargs))
+
+    async def msearch(self, **kwargs):
+        self.calls.append(('msearch', kwargs))
+        return {'responses': [
+            {'hits': {'total': 1, 'hits': [hit(1)]}},
+            {'error': {'type': 'search_phase_execution_exception'}},
+        ]}
+
+
+def run(coroutine):
+    """Run a coroutine in a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class ExampleSearch(AsyncRecordsSearch):
+    """Search with a default filter."""
+
+    class Meta:
+        index = 'records'
+        doc_types = ['record']
+        default_filter = Q('term', public=1)
+
+
+def test_execute():
+    """Test that searches are sent with the asynchronous client."""
+    client = AsyncClient()
+    app = Flask('testapp')
+    InvenioSearch(app, client=MagicMock(), async_clients={None: client})
+
+    with app.test_request_context(headers={'User-Agent': 'Chrome'},
+                                  environ_base={'REMOTE_ADDR': '1.2.3.4'}):
+        search = ExampleSearch().with_preference_param()
+        response = run(search.execute())
+        assert response.hits.total == 0
+        assert run(search.execute()) is response
+
+    method, kwargs = client.calls[0]
+    assert method == 'search'
+    assert kwargs['index'] == ['records']
+    assert kwargs['doc_type'] == ['record']
+    assert kwargs['preference']
+    assert kwargs['body']['query']['bool']['filter'] == [
+        {'term': {'public': 1}}]
+
+
+@pytest.mark.parametrize('scroll', [None, '1m'])
+def test_stream(scroll):
+    """Test iterating over all hits."""
+    client = AsyncClient(pages=[
+        {'_scroll_id': 's1', 'hits': {'hits': [hit(1), hit(2)]}},
+        {'_scroll_id': 's1', 'hits': {'hits': [hit(3)]}},
+        {'_scroll_id': 's1', 'hits': {'hits': []}},
+    ])
+
+    async def _collect():
+        stream = ExampleSearch(using=client).stream(batch_size=2,
+                                                    scroll=scroll)
+        return [hit.meta.id async for hit in stream]
+
+    assert run(_collect()) == ['1', '2', '3']
+    methods = [method for method, _ in client.calls]
+    if scroll:
+        assert methods == ['search', 'scroll', 'scroll', 'clear_scroll']
+    else:
+        assert methods == ['search', 'search']
+        assert client.calls[1][1]['body']['search_after'] == [2]
+
+
+def test_multi_search():
+    """Test executing several searches with one request."""
+    client = AsyncClient()
+    first = ExampleSearch(using=client)
+    second = ExampleSearch(using=client)
+    multi = AsyncMultiRecordsSearch(using=client).add(first).add(second)
+
+    responses = run(multi.execute(raise_on_error=False))
+    assert responses[1] is None
+    assert run(first.execute()).hits[0].meta.id == '1'
+    assert [method for method, _ in client.calls] == ['msearch']
+
+
+def test_execute_searches():
+    """Test that searches are executed concurrently."""
+    client = AsyncClient()
+    searches = [ExampleSearch(using=client) for _ in range(10)]
+
+    responses = run(execute_searches(searches, max_in_flight=4))
+    assert len(responses) == 10
+    assert client.max_in_flight == 4
+
+
+def test_clients_per_event_loop():
+    """Test that asynchronous clients are built once per event loop."""
+    from mock import patch
+
+    from invenio_search.aio import close_clients
+
+    app = Flask('testapp')
+    InvenioSearch(app)
+    state = app.extensions['invenio-search']
+
+    async def _clients():
+        return state.async_read_client, state.get_async_client()
+
+    async def _close():
+        await close_clients()
+
+    class Session(object):
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    def _client(**kwargs):
+        client = MagicMock()
+        client.transport.connection_pool.orig_connections = [
+            MagicMock(session=Session()) for _ in range(2)]
+        return client
+
+    with app.app_context(), patch.object(
+            state, '_async_client_builder', side_effect=_client):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        first, same = loop.run_until_complete(_clients())
+        assert first is same
+        loop.run_until_complete(_close())
+        pool = first.transport.connection_pool
+        assert all(connection.session.closed
+                   for connection in pool.orig_connections)
+        assert first.transport.sniffing_task.cancel.called
+        assert not first.transport.close.called
+        assert loop.run_until_complete(_clients())[0] is not first
+
+        other = asyncio.new_event_loop()
+        asyncio.set_event_loop(other)
+        assert other.run_until_complete(_clients())[0] is not first
+        loop.close()
+        other.close()
+        asyncio.set_event_loop(None)
+
+
+@pytest.mark.parametrize('method', [
+    'count', 'fetch_many', 'sliced_stream', 'dump_slices', 'faceted_search',
+])
+def test_sync_methods_not_supported(method):
+    """Test that the synchronous-only methods are refused."""
+    search = ExampleSearch(using=AsyncClient())
+    with pytest.raises(NotImplementedError):
+        getattr(search, method)(['1'])
+
+
+def test_async_client_pool_size():
+    """Test that the size of the pool of asynchronous clients is set."""
+    try:
+        import elasticsearch_async  # noqa
+    except Exception:
+        pytest.skip('elasticsearch-async is not available')
+
+    app = Flask('testapp')
+    app.config['SEARCH_ASYNC_CLIENT_CONFIG'] = dict(maxsize=7)
+    InvenioSearch(app)
+    loop = asyncio.new_event_loop()
+    with app.app_context():
+        client = app.extensions['invenio-search']._async_client_builder(
+            loop=loop)
+    connection = client.transport.connection_pool.connections[0]
+    assert connection.session.connector.limit == 7
+    loop.run_until_complete(connection.session.close())
+    loop.close()
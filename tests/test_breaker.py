@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Circuit breaker tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, \
+    NotFoundError, TransportError
+from flask import Flask
+from mock import MagicMock, patch
+
+from invenio_search import InvenioSearch, MultiRecordsSearch, RecordsSearch, \
+    current_search, current_search_client
+from invenio_search.breaker import CircuitBreaker, CircuitBreakerOpen, \
+    CircuitBreakerTransport, endpoint_type, is_failure
+
+
+@pytest.mark.parametrize('method,url,expected', [
+    ('GET', '/records/_search', 'search'),
+    ('POST', '/_msearch', 'search'),
+    ('GET', '/_search/scroll', 'search'),
+    ('GET', '/records/record/1', 'get'),
+    ('GET', '/records/record/_mget', 'get'),
+    ('POST', '/_bulk', 'bulk'),
+    ('PUT', '/records/record/1', 'bulk'),
+    ('POST', '/records/record', 'bulk'),
+    ('DELETE', '/records/record/1', 'bulk'),
+    ('PUT', '/records', 'admin'),
+    ('GET', '/_cluster/health', 'admin'),
+    ('PUT', '/_template/records', 'admin'),
+])
+def test_endpoint_type(method, url, expected):
+    """Test the classification of requests."""
+    assert endpoint_type(method, url) == expected
+
+
+def test_is_failure():
+    """Test which errors count as failures."""
+    assert is_failure(ConnectionError('N/A', 'down', None))
+    assert is_failure(ConnectionTimeout('TIMEOUT', 'slow', None))
+    assert is_failure(TransportError(503, 'unavailable'))
+    assert is_failure(TransportError(429, 'rejected'))
+    assert not is_failure(NotFoundError(404, 'missing'))
+
+
+def test_circuit_breaker():
+    """Test the states of the breaker."""
+    breaker = CircuitBreaker('test', failure_rate=0.5, min_calls=4,
+                             reset_timeout=10)
+    with patch('invenio_search.breaker.time.time', return_value=100):
+        for failed in (False, True, False):
+            breaker.before_call()
+            breaker.record(0.1, failed=failed)
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.before_call()
+        breaker.record(0.3, failed=True)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(CircuitBreakerOpen) as exc_info:
+            breaker.before_call()
+        assert 'test' in str(exc_info.value)
+        assert isinstance(exc_info.value, ConnectionError)
+
+    with patch('invenio_search.breaker.time.time', return_value=111):
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        # Only one probe at a time.
+        with pytest.raises(CircuitBreakerOpen):
+            breaker.before_call()
+        breaker.record(0.1, failed=True)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    with patch('invenio_search.breaker.time.time', return_value=122):
+        breaker.before_call()
+        breaker.record(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        stats = breaker.stats()
+    assert stats['state'] == 'closed'
+    assert stats['calls'] == 1
+    assert stats['failures'] == 0
+    assert stats['latency_max'] == 0.1
+    assert stats['rejected'] == 2
+    assert stats['trips'] == 2
+
+
+def test_circuit_breaker_slow_calls():
+    """Test that slow calls count as failures."""
+    breaker = CircuitBreaker('test', min_calls=2, slow_call_duration=1)
+    breaker.record(2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(3)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_transport():
+    """Test that the transport fails fast once the breaker is open."""
+    breakers = {'search': CircuitBreaker('search', min_calls=2)}
+    transport = CircuitBreakerTransport([{}], breakers=breakers)
+    with patch('elasticsearch.transport.Transport.perform_request',
+               side_effect=ConnectionError('N/A', 'down', None)) as request:
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                transport.perform_request('GET', '/records/_search')
+        with pytest.raises(CircuitBreakerOpen):
+            transport.perform_request('GET', '/records/_search')
+        assert request.call_count == 2
+
+        # Other endpoints have their own breaker.
+        with pytest.raises(ConnectionError) as exc_info:
+            transport.perform_request('GET', '/records/record/1')
+        assert not isinstance(exc_info.value, CircuitBreakerOpen)
+        assert request.call_count == 3
+
+
+def test_breaker_config():
+    """Test that the breakers are installed on the clients."""
+    app = Flask('testapp')
+    InvenioSearch(app)
+    with app.app_context():
+        assert not isinstance(current_search_client.transport,
+                              CircuitBreakerTransport)
+        assert current_search.breaker_stats() == {}
+
+    app = Flask('testapp')
+    app.config['SEARCH_CIRCUIT_BREAKER'] = {
+        'min_calls': 5, 'search': {'slow_call_duration': 2}}
+    app.config['SEARCH_READ_HOSTS'] = ['es-read:9200']
+    InvenioSearch(app)
+    with app.app_context():
+        transport = current_search_client.transport
+        assert isinstance(transport, CircuitBreakerTransport)
+        assert transport.breakers == current_search.get_breakers()
+        assert transport.breakers['search'].slow_call_duration == 2
+        assert transport.breakers['search'].min_calls == 5
+        assert transport.breakers['get'].slow_call_duration is None
+        read_breakers = current_search.read_client.transport.breakers
+        assert read_breakers['search'] is not transport.breakers['search']
+
+        stats = current_search.breaker_stats()
+        assert set(stats) == set(['default', 'read'])
+        assert stats['default']['search']['state'] == 'closed'
+
+
+def test_search_timeout():
+    """Test the timeout budget of search classes."""
+    class FastSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            timeout = 0.5
+
+    assert FastSearch()._params == {}
+    assert FastSearch()._request_params() == {'request_timeout': 0.5}
+    assert FastSearch().params(request_timeout=2)._request_params() == {
+        'request_timeout': 2}
+    assert RecordsSearch()._request_params() == {}
+
+    client = MagicMock()
+    client.search.return_value = {'hits': {'total': 0, 'hits': []}}
+    FastSearch(using=client).execute()
+    assert client.search.call_args[1]['request_timeout'] == 0.5
+
+    client.msearch.return_value = {'responses': [
+        {'hits': {'total': 0, 'hits': []}}] * 2}
+    multi = MultiRecordsSearch(using=client).add(
+        FastSearch()).add(FastSearch().params(request_timeout=2))
+    multi.execute()
+    kwargs = client.msearch.call_args[1]
+    assert kwargs['request_timeout'] == 2
+    assert all('request_timeout' not in header
+               for header in kwargs['body'][::2])
+
+    client.msearch.reset_mock()
+    MultiRecordsSearch(using=client).add(FastSearch()).add(
+        RecordsSearch()).execute()
+    assert 'request_timeout' not in client.msearch.call_args[1]
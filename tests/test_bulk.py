@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Bulk indexing tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+import pytest
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JSONSerializer
+from mock import MagicMock, patch
+
+from invenio_search import BulkIndexer
+
+
+def bulk_client(status=201):
+    """Build a client mock answering bulk requests."""
+    client = MagicMock()
+    client.transport.serializer = JSONSerializer()
+
+    def _bulk(body, **kwargs):
+        actions = body.splitlines()[::2]
+        return {'items': [{'index': {'status': status}} for _ in actions]}
+
+    client.bulk.side_effect = _bulk
+    return client
+
+
+@pytest.mark.parametrize('max_in_flight', [1, 3])
+def test_bulk_indexer_chunks(max_in_flight):
+    """Test that actions are sent in chunks."""
+    client = bulk_client()
+    with BulkIndexer(client=client, index='records', doc_type='record',
+                     chunk_size=3, max_in_flight=max_in_flight) as indexer:
+        for i in range(10):
+            indexer.index({'title': str(i)}, id=i)
+
+    assert indexer.success == 10
+    assert indexer.errors == []
+    assert client.bulk.call_count == 4
+    body = client.bulk.call_args_list[0][1]['body']
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert lines[:2] == [{'index': {'_id': 0}}, {'title': '0'}]
+    assert client.bulk.call_args[1]['index'] == 'records'
+
+
+def test_bulk_indexer_max_bytes():
+    """Test that requests are limited in size."""
+    client = bulk_client()
+    indexer = BulkIndexer(client=client, max_chunk_bytes=100)
+    for i in range(4):
+        indexer.index({'title': 'x' * 40})
+    assert indexer.close() == (4, [])
+    assert client.bulk.call_count == 4
+
+    # Non-ASCII characters take several bytes on the wire.
+    client = bulk_client()
+    indexer = BulkIndexer(client=client, max_chunk_bytes=150)
+    for i in range(4):
+        indexer.index({'title': u'\xe9' * 40})
+    assert indexer.close() == (4, [])
+    assert client.bulk.call_count == 4
+
+
+@pytest.mark.parametrize('max_in_flight', [1, 2])
+def test_bulk_indexer_invalidates_cache(max_in_flight):
+    """Test that cached searches are invalidated after each request."""
+    from flask import Flask
+
+    from invenio_search import InvenioSearch
+
+    app = Flask('testapp')
+    app.config['SEARCH_RESULT_CACHE'] = 'invenio_search.cache:DictSearchCache'
+    client = bulk_client()
+    search = InvenioSearch(app, client=client)
+    events = []
+    client.bulk.side_effect = lambda body, **kwargs: (
+        events.append('bulk') or
+        {'items': [{'index': {'status': 201}}]})
+
+    with app.app_context(), patch.object(
+            search._state, 'invalidate_cache',
+            side_effect=lambda: events.append('invalidate')):
+        indexer = BulkIndexer(client=client, chunk_size=1,
+                              max_in_flight=max_in_flight)
+        indexer.index({'title': 'a'})
+        indexer.index({'title': 'b'})
+        indexer.close()
+    # Each request is done before its invalidation.
+    assert sorted(events) == ['bulk'] * 2 + ['invalidate'] * 2
+    assert all(events[:i].count('bulk') >= events[:i].count('invalidate')
+               for i in range(len(events) + 1))
+
+
+def test_bulk_indexer_errors():
+    """Test error reporting."""
+    client = bulk_client(status=400)
+    indexer = BulkIndexer(client=client, raise_on_error=False)
+    indexer.index({'title': 'a'})
+    success, errors = indexer.close()
+    assert success == 0
+    assert len(errors) == 1
+
+    indexer = BulkIndexer(client=client)
+    indexer.index({'title': 'a'})
+    with pytest.raises(BulkIndexError):
+        indexer.close()
+
+
+def test_bulk_indexer_retries_rejected():
+    """Test that rejected documents are sent again."""
+    client = bulk_client()
+    responses = iter([
+        {'items': [{'index': {'status': 201}}, {'index': {'status': 429}}]},
+        {'items': [{'index': {'status': 429}}]},
+        {'items': [{'index': {'status': 201}}]},
+    ])
+    client.bulk.side_effect = lambda body, **kwargs: next(responses)
+
+    with patch('invenio_search.bulk.time.sleep') as sleep:
+        indexer = BulkIndexer(client=client, initial_backoff=1)
+        indexer.index({'title': 'a'})
+        indexer.index({'title': 'b'})
+        assert indexer.close() == (2, [])
+    assert [call[0][0] for call in sleep.call_args_list] == [1, 2]
+    assert '"b"' in client.bulk.call_args[1]['body']
+    assert '"a"' not in client.bulk.call_args[1]['body']
+
+    stats = indexer.stats
+    assert stats['rejected'] == 2
+    assert stats['retries'] == 2
+    assert stats['requests'] == 3
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_bulk_indexer_index_lines(processes):
+    """Test indexing lines of JSON documents."""
+    client = bulk_client()
+    lines = ('{{"id": {0}, "title": "{0}"}}\n'.format(i) for i in range(25))
+    with BulkIndexer(client=client, chunk_size=10) as indexer:
+        indexer.index_lines(lines, id_field='id', processes=processes,
+                            queue_size=1)
+
+    assert indexer.success == 25
+    assert client.bulk.call_count == 3
+    body = client.bulk.call_args_list[0][1]['body']
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert lines[:2] == [{'index': {'_id': 0}}, {'id': 0, 'title': '0'}]
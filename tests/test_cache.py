@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Search result cache tests."""
+
+from __future__ import absolute_import, print_function
+
+from elasticsearch_dsl import Q
+from flask import Flask
+from mock import MagicMock, patch
+
+from invenio_search import InvenioSearch, RecordsSearch
+from invenio_search.cache import DictSearchCache, LRUSearchCache
+
+
+def test_lru_cache():
+    """Test eviction and expiration of the LRU cache."""
+    cache = LRUSearchCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    with patch('invenio_search.cache.time.time', return_value=0):
+        cache.set('d', 4, timeout=10)
+    with patch('invenio_search.cache.time.time', return_value=9):
+        assert cache.get('d') == 4
+    with patch('invenio_search.cache.time.time', return_value=10):
+        assert cache.get('d') is None
+
+
+def test_cached_search():
+    """Test that responses are cached until the next write."""
+    app = Flask('testapp')
+    app.config['SEARCH_RESULT_CACHE'] = 'invenio_search.cache:DictSearchCache'
+    client = MagicMock()
+    client.search.return_value = {'hits': {'total': 1, 'hits': []}}
+    search = InvenioSearch(app, client=client)
+    assert isinstance(search.result_cache, DictSearchCache)
+
+    class NoCacheSearch(RecordsSearch):
+        class Meta:
+            cache_timeout = 0
+
+    with app.app_context():
+        for _ in range(2):
+            assert RecordsSearch().execute().hits.total == 1
+        assert client.search.call_count == 1
+
+        RecordsSearch().query(Q('match', title='higgs')).execute()
+        assert client.search.call_count == 2
+
+        search.invalidate_cache()
+        RecordsSearch().execute()
+        assert client.search.call_count == 3
+
+        NoCacheSearch().execute()
+        NoCacheSearch().execute()
+        assert client.search.call_count == 5
+
+
+def test_cached_search_copies():
+    """Test that cached responses are not shared between callers."""
+    app = Flask('testapp')
+    app.config['SEARCH_RESULT_CACHE'] = 'invenio_search.cache:LRUSearchCache'
+    client = MagicMock()
+    client.search.return_value = {'hits': {'total': 1, 'hits': []}}
+    InvenioSearch(app, client=client)
+
+    with app.app_context():
+        response = RecordsSearch().execute()
+        response.hits.hits.append({'_id': 'x'})
+        response = RecordsSearch().execute()
+        response.hits.hits.append({'_id': 'x'})
+        assert RecordsSearch().execute().hits.hits == []
+        assert client.search.call_count == 1
+
+
+def test_batches_not_cached():
+    """Test that the pages of streams and fetches are not cached."""
+    app = Flask('testapp')
+    app.config['SEARCH_RESULT_CACHE'] = 'invenio_search.cache:DictSearchCache'
+    client = MagicMock()
+    client.search.return_value = {'hits': {'total': 1, 'hits': [
+        {'_index': 'records', '_type': 'record', '_id': '1',
+         '_source': {}, 'sort': [1]}]}}
+    search = InvenioSearch(app, client=client)
+
+    with app.app_context():
+        assert len(list(RecordsSearch().stream(batch_size=10))) == 1
+        RecordsSearch().fetch_many(['1'])
+        assert client.search.call_count == 2
+        assert search.result_cache._data == {}
+
+
+def test_shared_cache():
+    """Test that processes sharing a cache share the cached responses."""
+    shared = DictSearchCache()
+    apps, clients = [], []
+    for _ in range(2):
+        app = Flask('testapp')
+        app.config['SEARCH_RESULT_CACHE'] = shared
+        client = MagicMock()
+        client.transport.hosts = [{'host': 'localhost', 'port': 9200}]
+        client.search.return_value = {'hits': {'total': 1, 'hits': []}}
+        InvenioSearch(app, client=client)
+        apps.append(app)
+        clients.append(client)
+
+    with apps[0].app_context():
+        RecordsSearch().execute()
+    with apps[1].app_context():
+        assert RecordsSearch().execute().hits.total == 1
+        assert clients[1].search.call_count == 0
+
+        RecordsSearch().execute(ignore_cache=True)
+        assert clients[1].search.call_count == 1
+    assert clients[0].search.call_count == 1
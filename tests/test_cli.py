@@ -31,9 +31,11 @@ import ast
 
 from click.testing import CliRunner
 from elasticsearch import VERSION as ES_VERSION
+from flask import Flask
 from flask.cli import ScriptInfo
-from mock import patch
+from mock import MagicMock, patch
 
+from invenio_search import InvenioSearch
 from invenio_search.cli import index as cmd
 from invenio_search.proxies import current_search_client
 
@@ -140,3 +142,71 @@ def test_list(app):
         u"│  │  ├──records-bibliographic-bibliographic-v1.0.0\n"
         u"│  ├──records-default-v1.0.0\n\n"
     )
+
+
+def test_bulk():
+    """Run bulk indexing of NDJSON input."""
+    from elasticsearch.serializer import JSONSerializer
+
+    client = MagicMock()
+    client.transport.serializer = JSONSerializer()
+    client.bulk.side_effect = lambda body, **kwargs: {'items': [
+        {'index': {'status': 201}} for _ in body.splitlines()[::2]]}
+    app = Flask('testapp')
+    InvenioSearch(app, client=client)
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info: app)
+    documents = '\n'.join('{{"id": {0}}}'.format(i) for i in range(5))
+
+    result = runner.invoke(
+        cmd, ['bulk', 'records', 'record', '--id-field', 'id',
+              '--chunk-size', '2', '--verbose'],
+        input=documents + '\n\n', obj=script_info)
+    assert 0 == result.exit_code
+    assert '"success": 5' in result.output
+    assert client.bulk.call_count == 3
+
+
+def test_put_retries():
+    """Test that transient errors are retried and reported."""
+    from elasticsearch.exceptions import ConnectionTimeout, TransportError
+
+    client = MagicMock()
+    client.index.side_effect = [TransportError(429, 'rejected'),
+                                {'created': True}]
+    app = Flask('testapp')
+    app.config['SEARCH_RETRY'] = {'backoff_base': 0}
+    InvenioSearch(app, client=client)
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info: app)
+    result = runner.invoke(
+        cmd, ['put', 'records', 'record', '-b', '-', '--verbose'],
+        input='{"title": "Test"}', obj=script_info)
+    assert 0 == result.exit_code
+    assert 'Retried 1 request(s).' in result.output
+    assert '"created": true' in result.output
+    assert client.index.call_count == 2
+    assert client.index.call_args[1]['refresh'] in ('wait_for', True)
+
+    # Without identifier, a timed out request may have indexed the document.
+    client.index.reset_mock()
+    client.index.side_effect = [
+        ConnectionTimeout('TIMEOUT', 'timed out', None), {'created': True}]
+    result = runner.invoke(cmd, ['put', 'records', 'record', '-b', '-'],
+                           input='{"title": "Test"}', obj=script_info)
+    assert 0 != result.exit_code
+    assert client.index.call_count == 1
+
+    # With identifier, a conflict after a retry means the document exists.
+    client.index.reset_mock()
+    client.index.side_effect = [
+        ConnectionTimeout('TIMEOUT', 'timed out', None),
+        TransportError(409, 'version_conflict_engine_exception', {})]
+    result = runner.invoke(cmd, ['put', 'records', 'record', '-b', '-',
+                                 '-i', '1'],
+                           input='{"title": "Test"}', obj=script_info)
+    assert 0 == result.exit_code
+    assert client.index.call_count == 2
+    assert client.index.call_args[1]['op_type'] == 'create'
@@ -29,8 +29,9 @@ from __future__ import absolute_import, print_function
 
 import pytest
 from elasticsearch import VERSION as ES_VERSION
+from elasticsearch.exceptions import TransportError
 from flask import Flask
-from mock import patch
+from mock import MagicMock, patch
 
 from invenio_search import InvenioSearch, current_search, current_search_client
 from invenio_search.utils import schema_to_index
@@ -94,6 +95,84 @@ def test_default_client(app):
         )
 
 
+def test_client_config():
+    """Test the configuration of the default client."""
+    from elasticsearch.connection import Urllib3HttpConnection
+
+    from invenio_search.connection import RequestsHttpConnection
+
+    app = Flask('testapp')
+    InvenioSearch(app)
+    with app.app_context():
+        connection = current_search_client.transport.get_connection()
+        assert isinstance(connection, RequestsHttpConnection)
+        assert connection.session.headers['accept-encoding'] == \
+            'gzip,deflate'
+        adapter = connection.session.get_adapter('http://localhost:9200')
+        assert adapter._pool_maxsize == 10
+
+    app = Flask('testapp')
+    app.config['SEARCH_CLIENT_CONFIG'] = {
+        'connection_class': 'elasticsearch.connection:Urllib3HttpConnection',
+        'maxsize': 25,
+        'timeout': 30,
+        'http_compress': False,
+        'hosts': ['es:9201'],
+    }
+    InvenioSearch(app)
+    with app.app_context():
+        connection = current_search_client.transport.get_connection()
+        assert isinstance(connection, Urllib3HttpConnection)
+        assert connection.pool.pool.maxsize == 25
+        assert connection.timeout == 30
+        assert connection.host == 'http://es:9201'
+        assert 'accept-encoding' not in connection.headers
+
+
+def test_client_lifecycle():
+    """Test that clients are built per process or thread, and closed."""
+    import os
+    import threading
+
+    app = Flask('testapp')
+    InvenioSearch(app)
+    state = app.extensions['invenio-search']
+
+    with patch.object(state, '_client_builder',
+                      side_effect=lambda **kwargs: MagicMock()):
+        client = state.client
+        assert state.client is client
+
+        # A forked process builds its own client.
+        with patch('invenio_search.ext.os.getpid',
+                   return_value=os.getpid() + 1):
+            child_client = state.client
+            assert child_client is not client
+            assert state.client is child_client
+        assert not client.transport.close.called
+
+        state.close()
+        assert not child_client.transport.close.called
+        client = state.client
+        assert client is not child_client
+
+        app.config['SEARCH_CLIENT_PER_THREAD'] = True
+        thread_clients = []
+        thread = threading.Thread(
+            target=lambda: thread_clients.extend([state.client] * 2))
+        thread.start()
+        thread.join()
+        assert thread_clients[0] is thread_clients[1]
+        assert thread_clients[0] is not state.client
+        assert state.client is state.client
+
+        main_client = state.client
+        state.close()
+        assert client.transport.close.called
+        assert main_client.transport.close.called
+        assert state.client is not main_client
+
+
 @pytest.mark.parametrize(('schema_url', 'result'), [
     ('invalidfileextension',
      (None, None)),
@@ -174,3 +253,397 @@ def test_whitelisted_aliases(app, aliases_config, expected_aliases):
             assert current_search_client.indices.exists(expected_aliases)
 
     app.config['SEARCH_MAPPINGS'] = orig
+
+
+def test_create_concurrently():
+    """Test that concurrent creation yields the same results in order."""
+    app = Flask('testapp')
+    client = MagicMock()
+    client.indices.create.side_effect = lambda index, **kwargs: index
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    search.register_mappings('authors', 'mock_module.mappings')
+
+    serial = list(search.create())
+    assert len(serial) == search.number_of_indexes
+    assert [name for name, _ in serial[:4]] == [r for _, r in serial[:4]]
+
+    client.reset_mock()
+    assert list(search.create(concurrency=4)) == serial
+    assert client.indices.create.call_count == 4
+    assert client.indices.update_aliases.call_count == 1
+
+
+def test_aliases_bulk_update():
+    """Test that aliases are added and removed with one request."""
+    app = Flask('testapp')
+    client = MagicMock()
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+
+    results = dict(search.create())
+    assert client.indices.update_aliases.call_count == 1
+    assert results['records'] == client.indices.update_aliases.return_value
+    actions = client.indices.update_aliases.call_args[1]['body']['actions']
+    aliases = dict((a['add']['alias'], set(a['add']['indices']))
+                   for a in actions)
+    assert aliases == {
+        'records': set(search.mappings.keys()),
+        'records-authorities': set(['records-authorities-authority-v1.0.0']),
+        'records-bibliographic': set([
+            'records-bibliographic-bibliographic-v1.0.0']),
+    }
+
+    client.reset_mock()
+    app.config['SEARCH_ALIAS_ACTIONS_CHUNK_SIZE'] = 2
+    results = list(search.delete())
+    assert len(results) == search.number_of_indexes
+    assert client.indices.update_aliases.call_count == 2
+    assert client.indices.delete.call_count == 3
+    assert all('remove' in action
+               for call in client.indices.update_aliases.call_args_list
+               for action in call[1]['body']['actions'])
+
+
+def test_clusters():
+    """Test that aliases are routed to their cluster."""
+    from invenio_search import RecordsSearch
+    from invenio_search.api import MultiRecordsSearch
+
+    app = Flask('testapp')
+    app.config['SEARCH_CLUSTER_ROUTING'] = {'records-authorities': 'archive'}
+    client, archive = MagicMock(), MagicMock()
+    search = InvenioSearch(app, client=client, clients={'archive': archive})
+    search.register_mappings('records', 'mock_module.mappings')
+
+    authority = 'records-authorities-authority-v1.0.0'
+    assert search.cluster_for(authority) == 'archive'
+    assert search.cluster_for('records-authorities') == 'archive'
+    assert search.cluster_for('records') is None
+    assert search.client_for('unknown') is client
+
+    list(search.create())
+    assert [call[1]['index'] for call
+            in archive.indices.create.call_args_list] == [authority]
+    assert client.indices.create.call_count == 2
+    actions = archive.indices.update_aliases.call_args[1]['body']['actions']
+    assert actions == [
+        {'add': {'indices': [authority], 'alias': 'records-authorities'}},
+        {'add': {'indices': [authority], 'alias': 'records'}},
+    ]
+    actions = client.indices.update_aliases.call_args[1]['body']['actions']
+    assert 'records-authorities' not in [a['add']['alias'] for a in actions]
+
+    list(search.delete())
+    assert archive.indices.delete.call_args[1]['index'] == [authority]
+    assert client.indices.delete.call_count == 2
+
+    class AuthoritySearch(RecordsSearch):
+        class Meta:
+            index = 'records-authorities'
+
+    class ArchiveSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            cluster = 'archive'
+
+    with app.app_context():
+        AuthoritySearch().execute()
+        assert archive.search.call_count == 1
+        RecordsSearch(index='records').execute()
+        assert client.search.call_count == 1
+        ArchiveSearch().execute()
+        assert archive.search.call_count == 2
+
+        # The cluster is routed from the indices the search has when
+        # executed.
+        RecordsSearch(index='records').index('records-authorities').execute()
+        assert archive.search.call_count == 3
+        RecordsSearch().index(authority).execute()
+        assert archive.search.call_count == 4
+        assert client.search.call_count == 1
+
+        client.msearch.return_value = {'responses': [{'hits': {'hits': []}}]}
+        archive.msearch.return_value = {'responses': [
+            {'hits': {'hits': []}}, {'hits': {'hits': []}}]}
+        responses = MultiRecordsSearch().add(AuthoritySearch()).add(
+            RecordsSearch(index='records')).add(ArchiveSearch()).execute()
+        assert len(responses) == 3
+        body = archive.msearch.call_args[1]['body']
+        assert [line.get('index') for line in body[::2]] == [
+            ['records-authorities'], ['records']]
+        body = client.msearch.call_args[1]['body']
+        assert [line.get('index') for line in body[::2]] == [['records']]
+
+
+def test_read_client():
+    """Test that searches use the read client with fallback."""
+    from elasticsearch.exceptions import ConnectionError, ConnectionTimeout
+
+    from invenio_search import RecordsSearch, current_search_read_client
+    from invenio_search.api import MultiRecordsSearch
+
+    app = Flask('testapp')
+    client = MagicMock()
+    InvenioSearch(app, client=client)
+    with app.app_context():
+        assert current_search_read_client._get_current_object() is client
+
+    app = Flask('testapp')
+    app.config['SEARCH_READ_HOSTS'] = ['es-read:9200']
+    InvenioSearch(app)
+    with app.app_context():
+        connection = current_search_read_client.transport.get_connection()
+        assert connection.host == 'http://es-read:9200'
+        assert current_search_read_client._get_current_object() is not \
+            current_search_client._get_current_object()
+
+    app = Flask('testapp')
+    read_client = MagicMock()
+    InvenioSearch(app, client=client, read_client=read_client)
+    with app.app_context():
+        RecordsSearch().execute()
+        assert read_client.search.call_count == 1
+        assert not client.search.called
+
+        read_client.search.side_effect = ConnectionError('N/A', 'down', None)
+        RecordsSearch().execute()
+        assert read_client.search.call_count == 2
+        assert client.search.call_count == 1
+        assert client.search.call_args == read_client.search.call_args
+
+        client.search.side_effect = ConnectionError('N/A', 'down', None)
+        with pytest.raises(ConnectionError):
+            RecordsSearch(using=client).execute()
+
+    # Slow searches are not sent again to the default client.
+    app = Flask('testapp')
+    client, read_client = MagicMock(), MagicMock()
+    InvenioSearch(app, client=client, read_client=read_client)
+    with app.app_context():
+        read_client.search.side_effect = ConnectionTimeout(
+            'TIMEOUT', 'slow', None)
+        with pytest.raises(ConnectionTimeout):
+            RecordsSearch().execute()
+        assert not client.search.called
+
+    # Other searches fall back to the default client too.
+    down = ConnectionError('N/A', 'down', None)
+    for method in ('search', 'scroll', 'msearch', 'clear_scroll'):
+        getattr(read_client, method).side_effect = down
+    client.search.side_effect = None
+    client.search.return_value = {'_scroll_id': 'a', 'hits': {'hits': [
+        {'_index': 'records', '_type': 'record', '_id': '1',
+         '_source': {}}]}}
+    client.scroll.return_value = {'_scroll_id': 'a', 'hits': {'hits': []}}
+    client.msearch.return_value = {'responses': [{'hits': {'hits': []}}]}
+    with app.app_context():
+        assert len(list(RecordsSearch().stream(scroll='1m'))) == 1
+        assert client.clear_scroll.call_count == 1
+        assert len(list(RecordsSearch().sliced_stream(2))) == 2
+        assert client.clear_scroll.call_count == 3
+        MultiRecordsSearch().add(RecordsSearch()).execute()
+        assert client.msearch.call_count == 1
+
+
+def test_index_generations():
+    """Test creating and reindexing versioned indices."""
+    app = Flask('testapp')
+    app.config['SEARCH_INDEX_GENERATIONS'] = True
+    client = MagicMock()
+    client.indices.get_alias.return_value = {}
+    client.indices.exists.return_value = False
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    name = 'records-default-v1.0.0'
+
+    with patch.object(search._state, '_new_generation', return_value='1'):
+        list(search.create())
+    created = dict((call[1]['index'], call[1]['body'])
+                   for call in client.indices.create.call_args_list)
+    assert set(created) == set(
+        '{0}-1'.format(name) for name in search.mappings)
+    assert created[name + '-1']['aliases'] == {name: {}}
+    actions = client.indices.update_aliases.call_args[1]['body']['actions']
+    aliases = dict((a['add']['alias'], a['add']['indices'])
+                   for a in actions)
+    assert name + '-1' in aliases['records']
+
+    client.reset_mock()
+    client.indices.get_alias.return_value = dict(
+        ('{0}-1'.format(index), {'aliases': {index: {}, 'records': {}}})
+        for index in search.mappings)
+    client.reindex.return_value = {'task': 'node:1'}
+    client.tasks.get.return_value = {'completed': True,
+                                     'response': {'created': 10}}
+    client.count.return_value = {'count': 10}
+
+    with patch.object(search._state, '_new_generation', return_value='2'):
+        results = dict(search.reindex())
+    assert results[name] == {'created': 10}
+    assert client.reindex.call_count == 3
+    actions = client.indices.update_aliases.call_args[1]['body']['actions']
+    assert {'remove': {'index': name + '-1', 'alias': name}} in actions
+    assert {'add': {'index': name + '-2', 'alias': name}} in actions
+    assert {'add': {'index': name + '-2', 'alias': 'records'}} in actions
+    deleted = [call[1]['index'] for call in
+               client.indices.delete.call_args_list]
+    assert set(deleted) == set(
+        '{0}-1'.format(index) for index in search.mappings)
+
+
+def test_create_generations_twice():
+    """Test that existing indices do not get another generation."""
+    from elasticsearch.exceptions import TransportError
+
+    app = Flask('testapp')
+    app.config['SEARCH_INDEX_GENERATIONS'] = True
+    client = MagicMock()
+    client.indices.get_alias.return_value = {}
+    client.indices.exists.return_value = False
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    name = 'records-default-v1.0.0'
+    plain = 'records-authorities-authority-v1.0.0'
+
+    with patch.object(search._state, '_new_generation', return_value='1'):
+        list(search.create())
+    assert client.indices.create.call_count == 3
+
+    # The first indices now exist, one of them without generation.
+    client.reset_mock()
+    client.indices.get_alias.return_value = dict(
+        ('{0}-1'.format(index), {'aliases': {index: {}, 'records': {}}})
+        for index in search.mappings if index != plain)
+    client.indices.exists.side_effect = lambda index: index == plain
+    error = {'error': {'type': 'resource_already_exists_exception'}}
+    client.indices.create.return_value = error
+    with patch.object(search._state, '_new_generation', return_value='2'):
+        results = dict(search.create(ignore=[400]))
+    created = [call[1]['index'] for call in
+               client.indices.create.call_args_list]
+    assert sorted(created) == sorted(search.mappings)
+    assert results[name] == error
+    actions = client.indices.update_aliases.call_args[1]['body']['actions']
+    indices = set(index for a in actions for index in a['add']['indices'])
+    assert indices == set(['{0}-1'.format(index) for index in search.mappings
+                           if index != plain] + [plain])
+
+    client.indices.create.side_effect = TransportError(
+        400, 'resource_already_exists_exception')
+    with patch.object(search._state, '_new_generation', return_value='3'):
+        with pytest.raises(TransportError):
+            list(search.create())
+
+
+def test_reindex_failures():
+    """Test that a failed copy does not replace the current generation."""
+    app = Flask('testapp')
+    app.config['SEARCH_INDEX_GENERATIONS'] = True
+    client = MagicMock()
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    client.indices.get_alias.return_value = dict(
+        ('{0}-1'.format(index), {'aliases': {index: {}}})
+        for index in search.mappings)
+    client.reindex.return_value = {'task': 'node:1'}
+    client.count.return_value = {'count': 10}
+
+    statuses = [
+        {'completed': True,
+         'response': {'created': 9, 'failures': [{'id': '1'}]}},
+        {'completed': True, 'error': {'type': 'task_failed'}},
+        # No failure reported, but documents are missing.
+        {'completed': True, 'response': {'created': 9}},
+    ]
+    for status in statuses:
+        client.reset_mock()
+        client.tasks.get.return_value = status
+        client.count.side_effect = [{'count': 10}, {'count': 9}]
+        with patch.object(search._state, '_new_generation',
+                          return_value='2'):
+            with pytest.raises(RuntimeError):
+                list(search.reindex())
+        assert not client.indices.update_aliases.called
+        deleted = [call[1]['index'] for call in
+                   client.indices.delete.call_args_list]
+        assert len(deleted) == 1 and deleted[0].endswith('-2')
+
+
+def test_copy_index_client_side():
+    """Test that the client-side copy keeps the routing of documents."""
+    app = Flask('testapp')
+    client = MagicMock()
+    search = InvenioSearch(app, client=client)
+    hits = [{'_type': 'record', '_id': '1', '_source': {}, '_routing': 'a'},
+            {'_type': 'record', '_id': '2', '_source': {}, '_parent': '1'}]
+    actions = []
+
+    def _bulk(client, actions_, **kwargs):
+        actions.extend(actions_)
+        return len(actions), []
+
+    with patch('elasticsearch.helpers.scan', return_value=iter(hits)), \
+            patch('elasticsearch.helpers.bulk', side_effect=_bulk):
+        assert search._copy_index('old', 'new', server_side=False) == \
+            {'created': 2}
+    assert actions[0]['_routing'] == 'a'
+    assert actions[1]['_parent'] == '1'
+    assert '_parent' not in actions[0]
+
+
+def test_bulk_load_mode():
+    """Test that index settings are restored after a bulk load."""
+    app = Flask('testapp')
+    client = MagicMock()
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    client.indices.get_settings.return_value = {
+        'records-authorities-authority-v1.0.0': {'settings': {
+            'index.number_of_replicas': '1'}},
+        'records-bibliographic-bibliographic-v1.0.0': {'settings': {
+            'index.refresh_interval': '30s',
+            'index.number_of_replicas': '2'}},
+    }
+
+    with pytest.raises(ValueError):
+        with search.bulk_load_mode('records'):
+            client.indices.put_settings.assert_called_once_with(
+                index=['records-authorities-authority-v1.0.0',
+                       'records-bibliographic-bibliographic-v1.0.0'],
+                body={'index.refresh_interval': '-1',
+                      'index.number_of_replicas': 0})
+            raise ValueError()
+
+    assert set(client.indices.get_settings.call_args[1]['index']) == set(
+        search.mappings)
+    restored = dict((call[1]['index'], call[1]['body'])
+                    for call in client.indices.put_settings.call_args_list[1:])
+    assert restored == {
+        'records-authorities-authority-v1.0.0': {
+            'index.refresh_interval': None,
+            'index.number_of_replicas': '1'},
+        'records-bibliographic-bibliographic-v1.0.0': {
+            'index.refresh_interval': '30s',
+            'index.number_of_replicas': '2'},
+    }
+    assert client.indices.refresh.call_count == 1
+
+    # All the indices are restored even if one of them fails.
+    client.reset_mock()
+    client.indices.put_settings.side_effect = [
+        None, TransportError(500, 'failed'), None]
+    with pytest.raises(ValueError):
+        with search.bulk_load_mode('records'):
+            raise ValueError()
+    assert client.indices.put_settings.call_count == 3
+    assert client.indices.refresh.call_count == 1
+
+    client.reset_mock()
+    client.indices.put_settings.side_effect = [
+        None, TransportError(500, 'failed'), None]
+    with pytest.raises(RuntimeError) as exc_info:
+        with search.bulk_load_mode('records'):
+            pass
+    assert 'records-authorities-authority-v1.0.0' in str(exc_info.value)
+    assert client.indices.put_settings.call_count == 3
@@ -29,10 +29,14 @@ from __future__ import absolute_import, print_function
 
 import hashlib
 
+import pytest
+from elasticsearch.serializer import JSONSerializer
 from elasticsearch_dsl import Q, Search
 from flask import request
+from mock import MagicMock, patch
 
 from invenio_search.api import DefaultFilter, RecordsSearch
+from invenio_search.serializer import FastJSONSerializer
 
 
 def test_empty_query(app):
@@ -146,3 +150,513 @@ def test_es_preference_param(app):
         digest = alg.hexdigest()
 
         assert new_rs.exposed_params == dict(preference=digest)
+
+
+def test_es_preference_param_config():
+    """Test that the preference is computed once per request."""
+    import zlib
+
+    from flask import Flask
+
+    app = Flask('testapp')
+    environ = {'REMOTE_ADDR': '212.54.1.8'}
+    user_string = '212.54.1.8-{0}'.format(b'Chrome').encode('utf8')
+
+    with app.test_request_context('/', headers={'User-Agent': 'Chrome'},
+                                  environ_base=environ):
+        with patch.object(RecordsSearch, '_get_user_agent',
+                          return_value=b'Chrome') as user_agent:
+            preference = RecordsSearch().with_preference_param()._params
+            assert RecordsSearch().with_preference_param()._params == \
+                preference
+        assert user_agent.call_count == 1
+        assert preference['preference'] == \
+            hashlib.md5(user_string).hexdigest()
+
+    app.config['SEARCH_PREFERENCE_HASH'] = 'zlib:crc32'
+    with app.test_request_context('/', headers={'User-Agent': 'Chrome'},
+                                  environ_base=environ):
+        assert RecordsSearch().with_preference_param()._params == {
+            'preference': str(zlib.crc32(user_string))}
+
+    app.config['SEARCH_PREFERENCE_BUCKETS'] = 4
+    with app.test_request_context('/', headers={'User-Agent': 'Chrome'},
+                                  environ_base=environ):
+        assert RecordsSearch().with_preference_param()._params == {
+            'preference': 'bucket-{0}'.format(zlib.crc32(user_string) % 4)}
+
+    app.config['SEARCH_PREFERENCE_HASH'] = None
+    with app.test_request_context('/', headers={'User-Agent': 'Chrome'},
+                                  environ_base=environ):
+        digest = hashlib.md5(user_string).hexdigest()
+        assert RecordsSearch().with_preference_param()._params == {
+            'preference': 'bucket-{0}'.format(int(digest, 16) % 4)}
+
+
+def hit(id_, sort=None):
+    """Build a raw search hit."""
+    result = {'_index': 'records', '_type': 'record', '_id': id_,
+              '_source': {'title': id_}}
+    if sort is not None:
+        result['sort'] = sort
+    return result
+
+
+def test_stream_search_after():
+    """Test streaming hits with search_after."""
+    client = MagicMock()
+    client.search.side_effect = [
+        {'hits': {'total': 3, 'hits': [hit('1', [1, 'a']),
+                                       hit('2', [2, 'b'])]}},
+        {'hits': {'total': 3, 'hits': [hit('3', [3, 'c'])]}},
+    ]
+
+    class TestSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            default_filter = DefaultFilter(Q('term', public=1))
+
+    hits = TestSearch(using=client)[20:30].stream(batch_size=2,
+                                                  sort=['year'])
+    assert [h.title for h in hits] == ['1', '2', '3']
+
+    first, second = [c[1]['body'] for c in client.search.call_args_list]
+    assert 'from' not in first
+    assert first['size'] == 2
+    assert first['sort'] == ['year', {'_uid': 'asc'}]
+    assert first['query']['bool']['filter'] == [{'term': {'public': 1}}]
+    assert 'search_after' not in first
+    assert second['search_after'] == [2, 'b']
+
+
+def test_stream_scroll():
+    """Test that the scroll context is cleared on early close."""
+    client = MagicMock()
+    client.search.return_value = {
+        '_scroll_id': 'scroll1',
+        'hits': {'total': 4, 'hits': [hit('1'), hit('2')]}}
+    client.scroll.return_value = {
+        '_scroll_id': 'scroll2',
+        'hits': {'total': 4, 'hits': [hit('3'), hit('4')]}}
+
+    scrolls = []
+    scroll = RecordsSearch._scroll
+
+    def _scroll(search, *args, **kwargs):
+        # Keep the inner generator alive, so that only an explicit close
+        # clears the scroll context.
+        scrolls.append(scroll(search, *args, **kwargs))
+        return scrolls[-1]
+
+    hits = RecordsSearch(using=client).stream(batch_size=2, scroll='1m')
+    with patch.object(RecordsSearch, '_scroll', _scroll):
+        assert [next(hits).title for _ in range(3)] == ['1', '2', '3']
+        hits.close()
+
+    assert client.search.call_args[1]['scroll'] == '1m'
+    assert client.search.call_args[1]['body']['sort'] == ['_doc']
+    client.clear_scroll.assert_called_once_with(
+        body={'scroll_id': ['scroll2']}, ignore=(404, ))
+
+
+def sliced_client(hits_per_slice=3):
+    """Build a client mock scrolling over sliced hits."""
+    client = MagicMock()
+
+    def _search(body, **kwargs):
+        slice_id = body['slice']['id']
+        return {'_scroll_id': str(slice_id), 'hits': {'hits': [
+            hit('{0}-{1}'.format(slice_id, i))
+            for i in range(hits_per_slice)]}}
+
+    client.search.side_effect = _search
+    client.scroll.return_value = {'hits': {'hits': []}}
+    return client
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_sliced_stream(ordered):
+    """Test merging hits of a sliced scroll."""
+    client = sliced_client()
+    hits = RecordsSearch(using=client).sliced_stream(
+        3, batch_size=3, ordered=ordered, queue_size=1)
+    ids = [h.title for h in hits]
+
+    assert sorted(ids) == sorted(
+        '{0}-{1}'.format(s, i) for s in range(3) for i in range(3))
+    if ordered:
+        assert ids == sorted(ids)
+    slices = [c[1]['body']['slice'] for c in client.search.call_args_list]
+    assert sorted(s['id'] for s in slices) == [0, 1, 2]
+    assert client.clear_scroll.call_count == 3
+
+
+def test_dump_slices(tmpdir):
+    """Test writing each slice to its own file."""
+    client = sliced_client(hits_per_slice=2)
+    filename = str(tmpdir.join('records-{0}.ndjson'))
+    result = RecordsSearch(using=client).dump_slices(filename, 2)
+
+    assert result == [(filename.format(0), 2), (filename.format(1), 2)]
+    with open(filename.format(1)) as fp:
+        assert fp.read() == '{"title": "1-0"}\n{"title": "1-1"}\n'
+
+
+def test_dump_slices_routed(tmpdir):
+    """Test that the client is resolved before the slices are dumped."""
+    from flask import Flask
+
+    from invenio_search import InvenioSearch
+
+    client = sliced_client(hits_per_slice=2)
+    app = Flask('testapp')
+    InvenioSearch(app, client=client)
+    filename = str(tmpdir.join('records-{0}.ndjson'))
+    with app.app_context():
+        result = RecordsSearch(index='records').dump_slices(filename, 2)
+
+    assert result == [(filename.format(0), 2), (filename.format(1), 2)]
+    assert client.clear_scroll.call_count == 2
+
+
+def test_fetch_many():
+    """Test fetching records in order with mget."""
+    from elasticsearch.exceptions import TransportError
+    from flask import Flask
+
+    from invenio_search import InvenioSearch
+
+    app = Flask('testapp')
+    search = InvenioSearch(app)
+    search.register_mappings('records', 'mock_module.mappings')
+    client = MagicMock()
+
+    def _mget(body, **kwargs):
+        return {'docs': [dict(hit(id_), found=True) if id_ != '2' else
+                         {'_id': id_, 'found': False}
+                         for id_ in body['ids']]}
+
+    client.mget.side_effect = _mget
+
+    class TestSearch(RecordsSearch):
+        class Meta:
+            index = 'records-default-v1.0.0'
+            doc_types = ['record']
+
+    with app.app_context():
+        hits = TestSearch(using=client).fetch_many(
+            [3, 2, 1], batch_size=2, source_includes=['title'])
+    assert [h.title if h else None for h in hits] == ['3', None, '1']
+    assert client.mget.call_count == 2
+    assert client.mget.call_args[1]['index'] == 'records-default-v1.0.0'
+    assert client.mget.call_args[1]['doc_type'] == 'record'
+    assert client.mget.call_args[1]['_source_include'] == ['title']
+
+    # Documents which could not be fetched are not reported as missing.
+    client.mget.side_effect = None
+    client.mget.return_value = {'docs': [
+        {'_id': '1', 'error': {'type': 'illegal_argument_exception'}}]}
+    with app.app_context(), pytest.raises(TransportError):
+        TestSearch(using=client).fetch_many([1])
+
+    # An alias may have several indices, it is searched instead.
+    client.search.return_value = {'hits': {'hits': [hit('1'), hit('3')]}}
+    with app.app_context():
+        hits = TestSearch(index='records', using=client).fetch_many(
+            ['3', '2', '1'])
+    assert [h.title if h else None for h in hits] == ['3', None, '1']
+    assert client.mget.call_count == 3
+    assert client.search.call_count == 1
+
+    # The default filter is applied with a search instead, and it is only
+    # built once for all the batches.
+    parser = MagicMock(side_effect=lambda query: query)
+
+    class FilteredSearch(TestSearch):
+        class Meta(TestSearch.Meta):
+            default_filter = DefaultFilter(Q('term', public=1),
+                                           query_parser=parser)
+
+    with app.app_context():
+        hits = FilteredSearch(using=client).fetch_many(['3', '2', '1'])
+    assert [h.title if h else None for h in hits] == ['3', None, '1']
+    body = client.search.call_args[1]['body']
+    assert body['size'] == 3
+    assert body['query']['bool']['filter'] == [{'term': {'public': 1}}]
+    assert client.mget.call_count == 3
+
+    with app.app_context():
+        FilteredSearch(using=client).fetch_many(['3', '2', '1'],
+                                                batch_size=1)
+    assert client.search.call_count == 5
+    assert parser.call_count == 2
+
+
+def test_multi_records_search():
+    """Test executing several searches in one request."""
+    from elasticsearch.exceptions import TransportError
+
+    from invenio_search.api import MultiRecordsSearch
+
+    client = MagicMock()
+    client.msearch.return_value = {'responses': [
+        {'hits': {'total': 1, 'hits': [hit('1')]}},
+        {'hits': {'total': 7, 'hits': []}},
+    ]}
+    latest = RecordsSearch(using=client, index='records')[:5]
+    counts = RecordsSearch(using=client).params(preference='abc')[:0]
+
+    responses = MultiRecordsSearch(using=client).add(latest).add(
+        counts).execute()
+    assert [r.hits.total for r in responses] == [1, 7]
+    assert latest.execute() is responses[0]
+    assert counts.execute().hits.total == 7
+    assert client.search.call_count == 0
+
+    body = client.msearch.call_args[1]['body']
+    assert body[0]['index'] == ['records']
+    assert body[2]['preference'] == 'abc'
+    assert body[3]['size'] == 0
+
+    client.msearch.return_value = {'responses': [
+        {'error': {'type': 'search_phase_execution_exception'}}]}
+    multi = MultiRecordsSearch(using=client).add(RecordsSearch(using=client))
+    assert multi.execute(ignore_cache=True, raise_on_error=False) == [None]
+    with pytest.raises(TransportError):
+        multi.execute(ignore_cache=True)
+
+
+def test_single_flight():
+    """Test that identical concurrent searches share one request."""
+    import threading
+    import time
+
+    from flask import Flask
+
+    from invenio_search.api import _single_flight
+
+    app = Flask('testapp')
+    app.config['SEARCH_SINGLE_FLIGHT'] = True
+    client = MagicMock()
+    started, release = threading.Event(), threading.Event()
+
+    def _search(**kwargs):
+        started.set()
+        release.wait()
+        return {'hits': {'total': 1, 'hits': [hit('1')]}}
+
+    client.search.side_effect = _search
+    totals, raws = [], []
+
+    def _run(query):
+        with app.app_context():
+            search = RecordsSearch(using=client).query(
+                Q('match', title=query))
+            response = search.execute()
+            totals.append(response.hits.total)
+            raws.append(response.to_dict())
+
+    # Release the requests only once all searches are in progress.
+    entered = threading.Semaphore(0)
+    do = _single_flight.do
+
+    def _do(key, func):
+        entered.release()
+        return do(key, func)
+
+    threads = [threading.Thread(target=_run, args=(query, ))
+               for query in ('higgs', 'higgs', 'higgs', 'boson')]
+    with patch.object(_single_flight, 'do', _do):
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for _ in threads:
+            entered.acquire()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert totals == [1, 1, 1, 1]
+    assert client.search.call_count == 2
+    # Each caller gets its own copy of the shared response.
+    assert len(set(id(raw) for raw in raws)) == 4
+
+
+def test_default_filter_memoize():
+    """Test that memoized default filters are built once per request."""
+    from flask import Flask, g
+
+    app = Flask('testapp')
+    parser = MagicMock(side_effect=lambda query: Q('terms', public=query))
+
+    class TestSearch(RecordsSearch):
+        class Meta:
+            default_filter = DefaultFilter(
+                lambda: g.public, query_parser=parser,
+                cache_key=lambda: g.public)
+
+    with app.test_request_context():
+        g.public = 1
+        TestSearch()
+        q = TestSearch()
+        assert parser.call_count == 1
+        assert q.to_dict()['query']['bool']['filter'] == [
+            {'terms': {'public': 1}}]
+        g.public = 0
+        TestSearch()
+        assert parser.call_count == 2
+
+    with app.test_request_context():
+        g.public = 1
+        TestSearch()
+        assert parser.call_count == 3
+
+
+def test_faceted_search_class_reused():
+    """Test that the faceted search class is built only once."""
+    from elasticsearch_dsl import TermsFacet
+
+    class TestSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            facets = {'type': TermsFacet(field='type')}
+
+    client = MagicMock()
+    first = TestSearch.faceted_search('higgs', search=TestSearch(
+        using=client))
+    second = TestSearch.faceted_search('boson', search=TestSearch(
+        using=client).params(preference='abc'))
+    assert first.__class__ is second.__class__
+    assert first.__class__ is not \
+        RecordsSearch.faceted_search('higgs').__class__
+    assert first._s._params == {}
+    assert second._s._params == {'preference': 'abc'}
+    assert '_filter_type' in first._s.to_dict()['aggs']
+
+    # Replaced facets are not served from the previous class.
+    TestSearch.Meta.facets = {'year': TermsFacet(field='year')}
+    third = TestSearch.faceted_search('higgs', search=TestSearch(
+        using=client))
+    assert third.__class__ is not first.__class__
+    assert list(third.facets) == ['year']
+
+
+@pytest.mark.parametrize('serializer', [
+    JSONSerializer(), FastJSONSerializer()])
+def test_static_aggs(serializer):
+    """Test that static aggregations are serialized once and spliced."""
+    from collections import OrderedDict
+
+    from elasticsearch_dsl import A
+
+    class TestSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            static_aggs = OrderedDict([
+                ('types', A('terms', field='type')),
+                ('years', {'date_histogram': {
+                    'field': 'date', 'interval': 'year'}}),
+            ])
+
+    client = MagicMock()
+    client.transport.serializer = serializer
+    client.search.return_value = {'hits': {'total': 0, 'hits': []}}
+
+    searches = [
+        TestSearch(using=client),
+        TestSearch(using=client).query(Q('match', title=u'h\xe9llo')),
+        TestSearch(using=client).query('match', title='higgs').post_filter(
+            'term', type='article').sort('-date').extra(size=5),
+    ]
+    search = TestSearch(using=client).query('match', title='boson')
+    search.aggs.bucket('authors', 'terms', field='author')
+    searches.append(search)
+
+    for search in searches:
+        body = search._serialize_body(serializer)
+        assert body == serializer.dumps(search.to_dict())
+        search.execute()
+        assert client.search.call_args[1]['body'] == body
+    assert list(searches[0].to_dict()['aggs']) == ['types', 'years']
+
+    # Modified static aggregations are serialized again.
+    search = TestSearch(using=client)
+    search.aggs.bucket('types', 'terms', field='subtype')
+    assert search._serialize_body(serializer) == search.to_dict()
+    search = RecordsSearch(using=client)
+    assert search._serialize_body(serializer) == search.to_dict()
+
+
+def test_hedged_search():
+    """Test that a slow search is sent again with another preference."""
+    import threading
+
+    from flask import Flask
+
+    from invenio_search.api import _LatencyTracker
+
+    app = Flask('testapp')
+    app.config['SEARCH_HEDGING'] = {
+        'percentile': 50, 'min_delay': 0, 'min_samples': 2}
+    client = MagicMock()
+    release = threading.Event()
+
+    def _search(**kwargs):
+        if kwargs.get('preference') == 'user':
+            release.wait()
+            return {'hits': {'total': 1, 'hits': [hit('1')]}}
+        return {'hits': {'total': 2, 'hits': [hit('2')]}}
+
+    client.search.side_effect = _search
+
+    class NeverHedgedSearch(RecordsSearch):
+        class Meta:
+            index = 'records'
+            hedge = False
+
+    tracker = _LatencyTracker()
+    with patch('invenio_search.api._latencies', tracker), \
+            app.app_context():
+        search = RecordsSearch(index='records', using=client).params(
+            preference='user')
+
+        # Not enough latencies recorded to hedge.
+        release.set()
+        assert search.execute().hits.total == 1
+        assert search.execute(ignore_cache=True).hits.total == 1
+        assert client.search.call_count == 2
+        assert tracker.percentile(('records', ), 50) is not None
+
+        release.clear()
+        tracker.record(('records', ), 0.01, 1000)
+        assert search.execute(ignore_cache=True).hits.total == 2
+        assert client.search.call_count == 4
+        assert client.search.call_args[1]['preference'] == 'user-hedge'
+
+        # A fast search is not duplicated.
+        assert RecordsSearch(index='records', using=client).execute() \
+            .hits.total == 2
+        assert client.search.call_count == 5
+
+        search = NeverHedgedSearch(using=client).params(preference='user')
+        thread = threading.Thread(target=search.execute)
+        thread.start()
+        release.set()
+        thread.join()
+        assert search.execute().hits.total == 1
+        assert client.search.call_count == 6
+
+
+def test_latency_tracker():
+    """Test the percentiles of the recent latencies."""
+    from invenio_search.api import _LatencyTracker
+
+    tracker = _LatencyTracker()
+    assert tracker.percentile('records', 95) is None
+    for latency in range(1, 101):
+        tracker.record('records', latency, window=50)
+    assert tracker.percentile('records', 50) == 75
+    assert tracker.percentile('records', 100) == 100
+    assert tracker.percentile('records', 95, min_samples=51) is None
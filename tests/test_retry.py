@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Retry policy tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, \
+    NotFoundError, TransportError
+from flask import Flask
+from mock import MagicMock, patch
+
+from invenio_search import InvenioSearch
+from invenio_search.breaker import CircuitBreakerOpen
+from invenio_search.retry import RetryPolicy
+
+
+def test_retry_policy():
+    """Test that transient errors are retried."""
+    policy = RetryPolicy(attempts=3, backoff_base=1, jitter=False)
+    func = MagicMock(side_effect=[
+        TransportError(429, 'es_rejected_execution_exception'),
+        ConnectionError('N/A', 'down', None),
+        'ok',
+    ])
+    with patch('invenio_search.retry.time.sleep') as sleep:
+        assert policy.call(func, index='records') == 'ok'
+    assert func.call_count == 3
+    assert func.call_args[1] == {'index': 'records'}
+    assert [call[0][0] for call in sleep.call_args_list] == [1, 2]
+    assert policy.retries == 2
+
+    func = MagicMock(side_effect=TransportError(503, 'unavailable'))
+    with patch('invenio_search.retry.time.sleep'):
+        with pytest.raises(TransportError):
+            policy.call(func)
+    assert func.call_count == 3
+    assert policy.retries == 4
+
+    for error in (NotFoundError(404, 'missing'),
+                  CircuitBreakerOpen('N/A', 'open', None)):
+        func = MagicMock(side_effect=error)
+        with pytest.raises(TransportError):
+            policy.call(func)
+        assert func.call_count == 1
+
+
+def test_retry_not_idempotent():
+    """Test that timed out requests are only retried if idempotent."""
+    policy = RetryPolicy(attempts=3, backoff_base=0)
+    timeout = ConnectionTimeout('TIMEOUT', 'timed out', None)
+
+    func = MagicMock(side_effect=[timeout, 'ok'])
+    assert policy.call(func, id='1') == 'ok'
+    assert func.call_args[1] == {'id': '1'}
+
+    func = MagicMock(side_effect=[timeout, 'ok'])
+    with pytest.raises(ConnectionTimeout):
+        policy.call(func, idempotent=False)
+    assert func.call_count == 1
+    assert func.call_args[1] == {}
+
+    func = MagicMock(side_effect=[ConnectionError('N/A', 'down', None), 'ok'])
+    assert policy.call(func, idempotent=False) == 'ok'
+
+
+def test_retry_create():
+    """Test that an index or document created by a lost attempt is kept."""
+    exists = TransportError(400, 'resource_already_exists_exception',
+                            {'error': {'type': 'already_exists'}})
+    client = MagicMock()
+    app = Flask('testapp')
+    app.config['SEARCH_RETRY'] = {'attempts': 2, 'backoff_base': 0}
+    search = InvenioSearch(app, client=client)
+    with app.app_context():
+        client.indices.create.side_effect = [
+            ConnectionTimeout('TIMEOUT', 'timed out', None), exists]
+        assert search.retry_create(
+            client.indices.create, index='records') == exists.info
+        assert client.indices.create.call_count == 2
+
+        client.indices.create.reset_mock()
+        client.indices.create.side_effect = [exists]
+        with pytest.raises(TransportError):
+            search.retry_create(client.indices.create, index='records')
+        assert client.indices.create.call_count == 1
+
+        conflict = TransportError(
+            409, 'version_conflict_engine_exception', {})
+        client.create.side_effect = [
+            ConnectionTimeout('TIMEOUT', 'timed out', None), conflict]
+        search.retry_create(client.create, index='records', id='1', body={})
+        assert client.create.call_count == 2
+
+
+def test_retry_backoff():
+    """Test the bounds of the backoff."""
+    policy = RetryPolicy(backoff_base=0.5, backoff_cap=3, jitter=False)
+    assert [policy.backoff(retry) for retry in range(1, 6)] == \
+        [0.5, 1, 2, 3, 3]
+
+    policy = RetryPolicy(backoff_base=0.5, backoff_cap=3)
+    for retry in range(1, 6):
+        assert 0 <= policy.backoff(retry) <= min(3, 0.5 * 2 ** (retry - 1))
+
+
+def test_retry_config():
+    """Test the retry policy of the extension."""
+    client = MagicMock()
+    client.indices.delete.side_effect = [TransportError(503, 'restarting')] \
+        + [{'acknowledged': True}] * 3
+    app = Flask('testapp')
+    app.config['SEARCH_RETRY'] = {'attempts': 2, 'backoff_base': 0}
+    search = InvenioSearch(app, client=client)
+    search.register_mappings('records', 'mock_module.mappings')
+    with app.app_context():
+        responses = dict(search.delete())
+        assert responses['records-default-v1.0.0'] == {'acknowledged': True}
+        assert client.indices.delete.call_count == 4
+        assert search.retry_policy.retries == 1
+
+    app = Flask('testapp')
+    app.config['SEARCH_RETRY'] = None
+    search = InvenioSearch(app, client=client)
+    assert search.retry_policy.attempts == 1
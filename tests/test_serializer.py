@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Serializer tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+from flask import Flask
+
+from invenio_search import InvenioSearch, current_search_client
+from invenio_search.serializer import FastJSONSerializer, orjson
+
+backends = ['json'] + (['orjson'] if orjson is not None else [])
+
+
+@pytest.mark.parametrize('backend', backends)
+def test_fast_json_serializer(backend):
+    """Test that the serializer is compatible with the default one."""
+    serializer = FastJSONSerializer(backend=backend)
+    data = {
+        'title': u'h\xe9llo',
+        'created': datetime(2017, 1, 2, 3, 4, 5, 6),
+        'date': date(2017, 1, 2),
+        'price': Decimal('1.5'),
+        'id': uuid.UUID('0d5a9bbc-2f47-4ad7-9b0b-b1d0b0d6a9c4'),
+        'values': [1, 2.5, None, True],
+    }
+
+    dumped = serializer.dumps(data)
+    assert json.loads(dumped) == json.loads(JSONSerializer().dumps(data))
+    assert json.loads(dumped)['created'] == '2017-01-02T03:04:05.000006'
+    assert serializer.loads(dumped)['id'] == str(data['id'])
+    assert serializer.dumps('{"a": 1}') == '{"a": 1}'
+
+    with pytest.raises(SerializationError):
+        serializer.dumps({'a': object()})
+    with pytest.raises(SerializationError):
+        serializer.loads('{')
+
+
+def test_client_serializer():
+    """Test that the client uses the configured serializer."""
+    app = Flask('testapp')
+    app.config['SEARCH_CLIENT_SERIALIZER'] = \
+        'invenio_search.serializer:FastJSONSerializer'
+    InvenioSearch(app)
+    with app.app_context():
+        serializer = current_search_client.transport.serializer
+        assert isinstance(serializer, FastJSONSerializer)
+        assert isinstance(current_search_client.transport.deserializer
+                          .serializers['application/json'],
+                          FastJSONSerializer)